@@ -0,0 +1,405 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from display import display_frame
+from facets import STOCK_SOLD_OUT, STOCK_ZERO, FacetIndex, parse_stock
+from relevance import ShardedBm25, build_bm25_indexes, top_k
+from schema import PrefixedStrings
+from text_index import ShardedTextIndex, SkuIndex, build_text_indexes, normalize_code
+
+# Columnas de texto en las que se puede buscar
+TEXT_COLUMNS = ('search_text', 'Descripcion')
+
+# Columnas de texto que se guardan con su prefijo compartido (ver PrefixedStrings)
+PREFIXED_COLUMNS = ('Url',)
+
+# Ordenamientos disponibles para los resultados
+ORDERINGS = ('precio', 'oferta', 'entrega', 'stock')
+
+
+def _readonly(array):
+    """Marca un arreglo de numpy como de solo lectura y lo devuelve."""
+    array.flags.writeable = False
+    return array
+
+
+def _permutation(*keys):
+    """
+    Permutación estable que ordena las filas por `keys` (la primera es la principal),
+    con los nulos al final, igual que `sort_values`.
+    """
+    return np.lexsort(tuple(reversed(keys))).astype(np.int64)
+
+
+def _provider_groups(df):
+    """
+    Filas de cada proveedor, en orden de proveedor (los sin proveedor al final, con clave
+    None) y en el orden original dentro de cada uno.
+
+    Returns:
+        list: Tuplas (proveedor, posiciones de sus filas en `df`)
+    """
+    codes, uniques = pd.factorize(df['Proveedor'], sort=True)
+    keys = np.where(codes < 0, len(uniques), codes)
+    order = np.argsort(keys, kind='stable').astype(np.int64)
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=len(uniques) + 1))])
+    providers = uniques.tolist() + [None]
+    groups = [(providers[i], order[bounds[i]:bounds[i + 1]])
+              for i in range(len(providers)) if bounds[i] < bounds[i + 1]]
+    return groups or [(None, order)]
+
+
+def shard_fingerprint(df):
+    """Huella del contenido de las filas de un fragmento (valores, columnas y tipos)."""
+    h = hashlib.sha1(repr([(c, str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _concat_frames(frames, labels):
+    """
+    Une los DataFrames de los fragmentos con el índice `labels`; las columnas que eran
+    categorías siguen siéndolo aunque cada fragmento tenga sus propias categorías.
+    """
+    joined = pd.concat(frames, ignore_index=True).set_axis(labels)
+    for col, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and not isinstance(joined[col].dtype, pd.CategoricalDtype):
+            joined[col] = joined[col].astype('category')
+    return joined
+
+
+class CatalogShard:
+    """
+    Filas de un único proveedor con todo lo que se calcula a partir de ellas: textos sin
+    nulos, columnas formateadas, índices de texto y de relevancia, códigos normalizados,
+    precios y stock. Las posiciones son locales al fragmento. No depende de los demás
+    proveedores, por lo que se reutiliza tal cual si su lista de precios no cambió.
+    """
+
+    def __init__(self, provider, df, fingerprint=None):
+        """
+        Args:
+            provider (str): Proveedor de las filas (None para las que no tienen)
+            df (pandas.DataFrame): Filas del proveedor
+            fingerprint (str): Huella del contenido, si ya se calculó
+        """
+        df = df.reset_index(drop=True)
+        self.provider = provider
+        self.fingerprint = fingerprint or shard_fingerprint(df)
+        # Descripciones nulas (antes de vaciarlas), que al ordenar por nombre van al final
+        self.name_missing = df['Descripcion'].isna().to_numpy()
+        for col in TEXT_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].fillna('')
+        self.columns = df.columns
+        # Las URL se guardan con su prefijo compartido y se arman sólo para las filas pedidas
+        self.prefixed = {col: PrefixedStrings(df[col]) for col in PREFIXED_COLUMNS if col in df.columns}
+        df = df.drop(columns=list(self.prefixed))
+        self.df = df
+        self.display = display_frame(df)
+        self.indexes = build_text_indexes(df, TEXT_COLUMNS)
+        self.relevance = build_bm25_indexes(self.indexes)
+        self.sku_codes = np.array([normalize_code(v) for v in df['Codigo Prov'].tolist()], dtype=object)
+
+        # Cantidad y estado del stock (con stock, cero, agotado o desconocido)
+        self.stock_value, self.stock_state = parse_stock(df['Stock'])
+        self.price = pd.to_numeric(df['Precio MSM'], errors='coerce').to_numpy(dtype=float)
+        self.offer = pd.to_numeric(df['Precio Oferta'], errors='coerce').to_numpy(dtype=float)
+        self.delivery = pd.to_numeric(df['T. Entrega'], errors='coerce').to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self.df)
+
+
+class Catalog:
+    """
+    Catálogo de productos de solo lectura.
+
+    Se guarda como un fragmento (CatalogShard) por proveedor, dispuestos uno tras otro:
+    las filas de cada proveedor ocupan un rango contiguo de posiciones. Toda la
+    normalización se hace una única vez por fragmento, y al crear una versión nueva se
+    reutilizan los fragmentos cuyo contenido no cambió. Un filtro de proveedores se
+    resuelve con esos rangos y la búsqueda de texto recorre sólo los fragmentos con
+    filas candidatas. Las consultas combinan máscaras booleanas o arreglos de posiciones
+    de fila y sólo se materializan las filas del resultado final, de modo que el
+    DataFrame compartido entre sesiones nunca se modifica.
+
+    El índice de los DataFrames que devuelve `take` es el número de fila en el CSV
+    original; `positions` lo traduce de vuelta a posiciones del catálogo.
+    """
+
+    def __init__(self, df, version=None, previous=None):
+        """
+        Args:
+            df (pandas.DataFrame): Catálogo tal como se leyó del CSV
+            version (str): Identificador de la versión del catálogo
+            previous (Catalog): Versión anterior, cuyos fragmentos sin cambios se reutilizan
+        """
+        df = df.reset_index(drop=True)
+        known = previous._shards if previous is not None else {}
+        shards, sources = [], []
+        for provider, rows in _provider_groups(df):
+            part = df.take(rows)
+            fingerprint = shard_fingerprint(part)
+            shard = known.get(provider)
+            if shard is None or shard.fingerprint != fingerprint:
+                shard = CatalogShard(provider, part, fingerprint)
+            shards.append(shard)
+            sources.append(rows)
+        self._assemble(shards, sources, version)
+        # Versión del CSV del que sale el catálogo (la misma, salvo tras recargar un proveedor)
+        self.source = version
+
+    def _assemble(self, shards, sources, version):
+        """
+        Combina los fragmentos en el catálogo: concatena sus columnas y calcula lo que
+        depende de todas las filas (códigos, orden por nombre y permutaciones preordenadas).
+
+        Args:
+            shards (list): CatalogShard en el orden de las filas
+            sources (list): Número de fila en el CSV de cada fila de cada fragmento
+            version (str): Identificador de la versión del catálogo
+        """
+        self.version = version
+        self._shards = {shard.provider: shard for shard in shards}
+        self._order = [shard.provider for shard in shards]
+        sizes = np.array([len(shard) for shard in shards], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self._ranges = {shard.provider: (int(a), int(a + n)) for shard, a, n in zip(shards, offsets, sizes)}
+        self.providers = sorted(p for p in self._order if p is not None)
+
+        self._source_rows = _readonly(np.concatenate(sources).astype(np.int64))
+        self._positions = np.full(self._source_rows.max() + 1 if len(self._source_rows) else 0, -1, dtype=np.int64)
+        self._positions[self._source_rows] = np.arange(len(self._source_rows))
+        labels = pd.Index(self._source_rows)
+        self._columns = shards[0].columns
+        self._df = _concat_frames([shard.df for shard in shards], labels)
+        # Columnas ya formateadas para mostrar (precios, stock, entrega), calculadas una vez por fragmento
+        self._display = _concat_frames([shard.display for shard in shards], labels)
+        self._prefixed = {col: PrefixedStrings.concat(shard.prefixed[col] for shard in shards)
+                          for col in shards[0].prefixed}
+
+        self.indexes = {col: ShardedTextIndex([shard.indexes[col] for shard in shards], offsets)
+                        for col in shards[0].indexes}
+        self.relevance = {col: ShardedBm25([shard.relevance[col] for shard in shards], offsets)
+                          for col in shards[0].relevance}
+        self.sku_index = SkuIndex(np.concatenate([shard.sku_codes for shard in shards]), normalized=True)
+
+        def joined(name):
+            return np.concatenate([getattr(shard, name) for shard in shards])
+
+        price, offer, delivery = joined('price'), joined('offer'), joined('delivery')
+        self.stock_state = _readonly(joined('stock_state'))
+        # Stock: se excluyen los que empiezan con '0' y los 'agotado'
+        self.in_stock = _readonly((self.stock_state != STOCK_ZERO) & (self.stock_state != STOCK_SOLD_OUT))
+        self.price = _readonly(price)
+        self.offer = _readonly(offer)
+        self.delivery = _readonly(delivery)
+        self.effective_price = _readonly(np.fmin(price, offer))
+        self.price_valid = _readonly(price > 0)
+        self.has_offer = _readonly(offer > 0)
+        self.stock_value = _readonly(joined('stock_value'))
+        # Bitmaps de los filtros (proveedor, stock, oferta, precio válido)
+        self.facets = FacetIndex(len(self._df), self._ranges, self.stock_state, self.has_offer, self.price_valid)
+
+        # Permutaciones preordenadas para cada ordenamiento y su inversa (posición -> rango);
+        # el último desempate es la fila del CSV, como si el catálogo no estuviera fragmentado
+        # Las descripciones nulas van después de todas, como con na_position='last'
+        self.name_missing = _readonly(joined('name_missing'))
+        _, name_rank = np.unique(self._df['Descripcion'].astype(str).to_numpy(), return_inverse=True)
+        name_rank = np.where(self.name_missing, len(name_rank), name_rank)
+        source = self._source_rows
+        self._orderings = {}
+        for name, perm in (
+            ('precio', _permutation(price, name_rank, source)),
+            ('oferta', _permutation(self.effective_price, name_rank, source)),
+            ('entrega', _permutation(delivery, price, name_rank, source)),
+            ('stock', _permutation(-self.stock_value, price, name_rank, source)),
+        ):
+            rank = np.empty(len(perm), dtype=np.int64)
+            rank[perm] = np.arange(len(perm))
+            self._orderings[name] = (_readonly(perm), _readonly(rank))
+
+    def with_provider(self, provider, df, version=None):
+        """
+        Nueva versión del catálogo con la lista de precios de `provider` reemplazada por
+        `df`; los fragmentos de los demás proveedores se reutilizan sin recalcular nada.
+
+        Args:
+            provider (str): Proveedor cuya lista se reemplaza (o se agrega)
+            df (pandas.DataFrame): Filas nuevas del proveedor (vacío para quitarlo)
+            version (str): Versión de la nueva copia; por defecto, la actual más la huella
+                de la lista nueva
+
+        Returns:
+            Catalog: Catálogo nuevo (éste no se modifica)
+        """
+        df = df.reindex(columns=self.columns).assign(Proveedor=provider).reset_index(drop=True)
+        shard = CatalogShard(provider, df)
+        if version is None:
+            version = f"{self.version}+{shard.fingerprint[:8]}"
+        parts = [(name, self._shards[name], self._source_rows[slice(*self._ranges[name])])
+                 for name in self._order if name != provider]
+        if len(df) or not parts:
+            next_row = len(self._positions)
+            parts.append((provider, shard, np.arange(next_row, next_row + len(df), dtype=np.int64)))
+        # Mismo orden que al cargar: por proveedor, con los que no tienen al final
+        parts.sort(key=lambda part: (part[0] is None, part[0] or ''))
+        catalog = Catalog.__new__(Catalog)
+        catalog._assemble([shard for _, shard, _ in parts], [rows for _, _, rows in parts], version)
+        catalog.source = self.source
+        return catalog
+
+    def __len__(self):
+        return len(self._df)
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def find(self, column, term, rows=None):
+        """
+        Posiciones ordenadas de las filas cuyo `column` contiene `term` (sin distinguir mayúsculas).
+
+        Args:
+            column (str): Columna de texto
+            term (str): Término buscado
+            rows (numpy.ndarray): Si se indica, sólo se evalúan estas posiciones (ordenadas)
+        """
+        return self.indexes[column].find(term.lower(), rows)
+
+    def find_many(self, column, terms, rows=None):
+        """
+        Filas cuyo `column` contiene cada uno de `terms`, recorriendo la columna una sola vez.
+
+        Returns:
+            dict: Término (en minúsculas) -> posiciones ordenadas
+        """
+        return self.indexes[column].find_many([t.lower() for t in terms], rows)
+
+    def estimate(self, column, term):
+        """Estimación (cota superior) del número de filas cuyo `column` contiene `term`."""
+        return self.indexes[column].estimate(term.lower())
+
+    def is_indexable(self, column, term):
+        """Indica si `term` se resuelve con el índice de `column` sin recorrer la columna."""
+        return self.indexes[column].is_indexable(term.lower())
+
+    def lookup_sku(self, code, limit=500):
+        """
+        Posiciones de las filas con código de proveedor `code` (normalizado); si no hay
+        coincidencia exacta, las de códigos que empiezan con `code`.
+        """
+        return self.sku_index.lookup(code, limit)
+
+    def ordered(self, rows, ordering='precio'):
+        """
+        Devuelve las filas indicadas en el orden `ordering`, sin ordenar en cada consulta.
+
+        Con muchas filas se recorre la permutación preordenada filtrándola con una máscara;
+        con pocas se ordenan sólo sus rangos precalculados.
+
+        Args:
+            rows (numpy.ndarray): Máscara booleana o arreglo de posiciones de fila
+            ordering (str): Uno de ORDERINGS
+
+        Returns:
+            numpy.ndarray: Posiciones de fila ordenadas
+        """
+        perm, rank = self._orderings[ordering]
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            return perm[rows[perm]]
+        if len(rows) > len(self) // 8:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[rows] = True
+            return perm[mask[perm]]
+        return rows[np.argsort(rank[rows], kind='stable')]
+
+    def ranked(self, rows, words, columns=TEXT_COLUMNS, tiebreak='precio', limit=None):
+        """
+        Devuelve las filas indicadas de más a menos relevante (BM25) para las palabras
+        de la consulta, desempatando por el ordenamiento `tiebreak`.
+
+        Args:
+            rows (numpy.ndarray): Posiciones de fila
+            words (list): Palabras de la consulta, en minúsculas
+            columns (tuple): Columnas cuyos puntajes se suman
+            tiebreak (str): Uno de ORDERINGS
+            limit (int): Si se indica, sólo las `limit` filas más relevantes
+
+        Returns:
+            numpy.ndarray: Posiciones de fila ordenadas
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros(len(rows), dtype=float)
+        for col in columns:
+            scores += self.relevance[col].scores(words, rows)
+        return top_k(rows, scores, self._orderings[tiebreak][1][rows], limit)
+
+    def filtered_rows(self, providers=None, exclude=False, in_stock=False):
+        """
+        Posiciones ordenadas de las filas con precio válido que pasan los filtros del
+        buscador, combinando los bitmaps precalculados sólo en los rangos de los
+        proveedores elegidos (ver FacetIndex.filter_rows).
+        """
+        return self.facets.filter_rows(providers, exclude, in_stock)
+
+    def provider_subset(self, rows, providers):
+        """Las filas de `rows` (posiciones ordenadas) cuyo proveedor está en `providers`."""
+        return self.facets.keep(rows, providers)
+
+    def provider_counts(self, rows=None, in_stock=False):
+        """
+        Cantidad de filas de `rows` (posiciones ordenadas) de cada proveedor; sin `rows`,
+        las de precio válido (y con stock, si `in_stock`) de todo el catálogo.
+        """
+        if rows is None:
+            return self.facets.totals(in_stock)
+        return self.facets.provider_counts(rows)
+
+    def positions(self, labels):
+        """Posiciones en el catálogo de las filas con esos números de fila del CSV (índice de `take`)."""
+        return self._positions[np.asarray(labels, dtype=np.int64)]
+
+    def take(self, rows, drop=('search_text',)):
+        """
+        Materializa las filas indicadas como un DataFrame nuevo.
+
+        Args:
+            rows (numpy.ndarray): Máscara booleana o arreglo de posiciones de fila
+            drop (tuple): Columnas que no se incluyen en el resultado
+
+        Returns:
+            pandas.DataFrame: Copia de las filas seleccionadas
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        result = self._with_prefixed(self._df.take(rows), rows)
+        return result.drop(columns=[c for c in drop if c in result.columns])
+
+    def _with_prefixed(self, frame, rows):
+        """Agrega a `frame` (filas `rows`) las columnas guardadas con prefijo compartido, en su lugar."""
+        for col, strings in self._prefixed.items():
+            frame.insert(self._columns.get_loc(col), col, strings.take(rows))
+        return frame
+
+    def display(self, rows, drop=('search_text',)):
+        """
+        Filas indicadas con las columnas ya formateadas para mostrar en una grilla.
+
+        Args:
+            rows (numpy.ndarray): Máscara booleana o arreglo de posiciones de fila
+            drop (tuple): Columnas que no se incluyen en el resultado
+
+        Returns:
+            pandas.DataFrame: Proyección de las filas con precios, stock y entrega como texto
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        result = self._with_prefixed(self._display.take(rows), rows)
+        return result.drop(columns=[c for c in drop if c in result.columns])
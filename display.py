@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Columnas de precio que se muestran con separador de miles
+PRICE_COLUMNS = ('Precio MSM', 'Precio Oferta', 'Precio Lista')
+
+_THOUSANDS = r'\B(?=(\d{3})+(?!\d))'
+
+
+def format_prices(values):
+    """
+    Formatea precios como enteros con punto de miles ("12.345"); vacío si no son positivos.
+
+    Args:
+        values: Serie o arreglo con los precios (números o texto numérico)
+
+    Returns:
+        pandas.Series: Precios formateados como texto
+    """
+    # Como float, para que los enteros con nulos (Int32, ...) den NaN y no pd.NA
+    numbers = pd.to_numeric(pd.Series(values), errors='coerce').astype(float)
+    valid = (numbers > 0).to_numpy()
+    text = pd.Series('', index=numbers.index, dtype=object)
+    if valid.any():
+        integers = numbers[valid].to_numpy(dtype=float).astype(np.int64).astype(str)
+        text[valid] = pd.Series(integers).str.replace(_THOUSANDS, '.', regex=True).to_numpy()
+    return text
+
+
+def format_whole(values):
+    """Formatea números sin decimales; deja el texto no numérico como está y los nulos vacíos."""
+    series = pd.Series(values)
+    numbers = pd.to_numeric(series, errors='coerce')
+    valid = numbers.notna().to_numpy()
+    text = series.astype(object).where(series.notna(), '')
+    if valid.any():
+        text[valid] = np.round(numbers[valid].to_numpy(dtype=float)).astype(np.int64).astype(str)
+    return text
+
+
+def format_stock(values):
+    """
+    Formatea el stock: las cantidades ("12" o "12.0") sin decimales y el resto del texto
+    ("Agotado", "Consultar", ...) tal cual.
+    """
+    series = pd.Series(values)
+    text = series.astype(str)
+    numeric = text.str.replace('.', '', n=1, regex=False).str.isdigit().to_numpy() & series.notna().to_numpy()
+    result = series.astype(object).where(series.notna(), '')
+    if numeric.any():
+        numbers = pd.to_numeric(text[numeric], errors='coerce').to_numpy(dtype=float)
+        result[numeric] = np.round(numbers).astype(np.int64).astype(str)
+    return result
+
+
+def display_frame(df, price_columns=PRICE_COLUMNS):
+    """
+    Copia de `df` con las columnas numéricas ya formateadas como texto para mostrar.
+
+    Se calcula una vez por catálogo (o por cotización), de modo que las grillas reciben
+    una proyección de columnas listas y no formatean celda por celda en cada recarga.
+
+    Args:
+        df (pandas.DataFrame): Filas del catálogo
+        price_columns (tuple): Columnas que se formatean como precio
+
+    Returns:
+        pandas.DataFrame: Mismo índice y columnas, con precios, stock y entrega como texto
+    """
+    formatted = {}
+    for col in price_columns:
+        if col in df.columns:
+            formatted[col] = format_prices(df[col]).to_numpy()
+    if 'T. Entrega' in df.columns:
+        formatted['T. Entrega'] = format_whole(df['T. Entrega']).to_numpy()
+    if 'Stock' in df.columns:
+        formatted['Stock'] = format_stock(df['Stock']).to_numpy()
+    return df.assign(**formatted)
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+# Estados del stock: con cantidad, cero (empieza con '0'), 'agotado' y sin dato o texto
+# ("Consultar", vacío); los productos "sin stock" son los de estado cero o agotado
+STOCK_IN = 0
+STOCK_ZERO = 1
+STOCK_SOLD_OUT = 2
+STOCK_UNKNOWN = 3
+STOCK_STATES = ('con stock', 'cero', 'agotado', 'desconocido')
+
+
+def parse_stock(values):
+    """
+    Cantidad y estado del stock de cada fila (STOCK_IN, STOCK_ZERO, STOCK_SOLD_OUT o
+    STOCK_UNKNOWN). Si la columna es una categoría se interpreta cada valor distinto una
+    sola vez.
+
+    Args:
+        values: Columna "Stock" tal como viene en el CSV (o como categoría)
+
+    Returns:
+        tuple: (cantidades float32, NaN si no es un número; estados int8)
+    """
+    series = pd.Series(values)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        quantity, states = parse_stock(pd.Series(series.cat.categories, dtype=object))
+        codes = series.cat.codes.to_numpy()
+        quantity = np.append(quantity, np.float32(np.nan))[codes]
+        return quantity, np.append(states, np.int8(STOCK_UNKNOWN))[codes]
+    text = series.astype(str).str.strip()
+    zero = text.str.startswith('0', na=False).to_numpy()
+    sold_out = text.str.lower().str.contains('agotado', regex=False, na=False).to_numpy()
+    quantity = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float32)
+    quantity[series.isna().to_numpy()] = np.nan
+    states = np.full(len(series), STOCK_UNKNOWN, dtype=np.int8)
+    states[~np.isnan(quantity)] = STOCK_IN
+    states[sold_out] = STOCK_SOLD_OUT
+    states[zero] = STOCK_ZERO
+    return quantity, states
+
+
+def bitmap(mask):
+    """Bitmap (bits empaquetados en bytes) de una máscara booleana."""
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+
+class FacetIndex:
+    """
+    Bitmaps precalculados de los filtros del buscador: uno por estado del stock, uno de
+    "tiene oferta" y uno de precio válido. Las filas de cada proveedor ocupan un rango
+    contiguo del catálogo, así que el filtro de proveedores es una lista de rangos.
+
+    Se arman una vez al cargar el catálogo; en cada búsqueda los bitmaps se combinan con
+    AND sobre bytes (ocho filas por byte) sólo dentro de los rangos de los proveedores
+    elegidos, de modo que el costo es proporcional a sus filas y no al catálogo. Los
+    mismos rangos dan el conteo por proveedor de las coincidencias.
+    """
+
+    def __init__(self, n_rows, provider_ranges, stock_state, has_offer, price_valid):
+        """
+        Args:
+            n_rows (int): Cantidad de filas del catálogo
+            provider_ranges (dict): Proveedor -> (inicio, fin) de su rango de filas (None
+                para las filas sin proveedor)
+            stock_state (numpy.ndarray): Estado del stock de cada fila (ver parse_stock)
+            has_offer (numpy.ndarray): Máscara de las filas con precio de oferta
+            price_valid (numpy.ndarray): Máscara de las filas con precio válido
+        """
+        self.n_rows = n_rows
+        self.ranges = {provider: (int(start), int(end)) for provider, (start, end) in provider_ranges.items()}
+        self.stock = {state: bitmap(stock_state == code) for code, state in enumerate(STOCK_STATES)}
+        self.has_offer = bitmap(has_offer)
+        self.price_valid = bitmap(price_valid)
+        # Productos que no se ocultan con "Mostrar productos sin stock: No"
+        self.available = self.stock['con stock'] | self.stock['desconocido']
+        # Filas con precio válido de cada proveedor (todas o sólo las con stock), para los
+        # conteos de un listado sin términos de búsqueda
+        available = np.asarray(price_valid, dtype=bool) & ((stock_state == STOCK_IN) | (stock_state == STOCK_UNKNOWN))
+        self._totals = {
+            in_stock: {provider: int(np.count_nonzero(mask[start:end]))
+                       for provider, (start, end) in self.ranges.items() if provider is not None}
+            for in_stock, mask in ((False, np.asarray(price_valid, dtype=bool)), (True, available))
+        }
+
+    def spans(self, providers=None, exclude=False):
+        """
+        Rangos (inicio, fin) ordenados de las filas de `providers` (o de todos los demás,
+        con `exclude`; de todos si `providers` es None), uniendo los contiguos.
+        """
+        if providers is None:
+            chosen = self.ranges.values()
+        else:
+            selected = set(providers)
+            chosen = [span for provider, span in self.ranges.items() if (provider in selected) != exclude]
+        spans = []
+        for start, end in sorted(span for span in chosen if span[0] < span[1]):
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        return spans
+
+    def filter_rows(self, providers=None, exclude=False, in_stock=False):
+        """
+        Posiciones ordenadas de las filas con precio válido que pasan los filtros del buscador.
+
+        Args:
+            providers (iterable): Proveedores a incluir (o excluir, con `exclude`); None sin filtro
+            exclude (bool): Excluir `providers` en lugar de incluirlos
+            in_stock (bool): Ocultar los productos sin stock (cero o agotado)
+        """
+        parts = []
+        for start, end in self.spans(providers, exclude):
+            lo, hi = start // 8, (end + 7) // 8
+            bits = self.price_valid[lo:hi]
+            if in_stock:
+                bits = bits & self.available[lo:hi]
+            parts.append(np.flatnonzero(np.unpackbits(bits)[start - 8 * lo:end - 8 * lo]) + start)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def keep(self, rows, providers, exclude=False):
+        """Las filas de `rows` (posiciones ordenadas) de `providers` (o de los demás, con `exclude`)."""
+        parts = [rows[a:b] for a, b in (np.searchsorted(rows, span) for span in self.spans(providers, exclude))]
+        return np.concatenate(parts) if parts else rows[:0]
+
+    def provider_counts(self, rows):
+        """Cantidad de filas de `rows` (posiciones ordenadas) de cada proveedor."""
+        providers = [p for p in self.ranges if p is not None]
+        if not providers:
+            return {}
+        bounds = np.searchsorted(rows, [self.ranges[p] for p in providers])
+        return {provider: int(b - a) for provider, (a, b) in zip(providers, bounds)}
+
+    def totals(self, in_stock=False):
+        """Cantidad de filas con precio válido (y con stock, si `in_stock`) de cada proveedor."""
+        return dict(self._totals[in_stock])
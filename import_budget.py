@@ -0,0 +1,99 @@
+"""
+Control del tiempo de arranque del buscador.
+
+Importa en un proceso limpio los módulos que carga una sesión de búsqueda (los mismos que
+importa main.py) con `python -X importtime` y falla si:
+    - el tiempo total de importación supera el presupuesto, o
+    - se cargó alguna dependencia que sólo usan el reporte o la sincronización con
+      Google Sheets (plotly, seaborn, matplotlib, gspread, google-auth, gdown).
+
+Las dependencias que ya carga el propio streamlit no se cuentan como prohibidas.
+
+Uso:
+    python import_budget.py [--budget MS] [--top N]
+
+El presupuesto por defecto se puede cambiar con la variable IMPORT_BUDGET_MS.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Módulos que importa main.py para una sesión de búsqueda
+SEARCH_MODULES = ('streamlit', 'pandas', 'search', 'catalog', 'display', 'schema', 'snapshot', 'store', 'refresh', 'quote', 'logger')
+
+# Paquetes que no deben cargarse en el arranque de una sesión de búsqueda
+FORBIDDEN = ('plotly', 'seaborn', 'matplotlib', 'gspread', 'google.oauth2', 'gdown')
+
+# Presupuesto del arranque en frío, en milisegundos
+DEFAULT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 4000))
+
+
+def import_profile(modules):
+    """
+    Importa `modules` en un proceso nuevo y devuelve su perfil de `-X importtime`.
+
+    Returns:
+        list: Tuplas (nombre, microsegundos propios, microsegundos acumulados, nivel)
+    """
+    code = '; '.join(f'import {m}' for m in modules)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudieron importar los módulos:\n{proc.stderr}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def _forbidden_package(name):
+    """Paquete de FORBIDDEN al que pertenece `name`, o None."""
+    for package in FORBIDDEN:
+        if name == package or name.startswith(package + '.'):
+            return package
+    return None
+
+
+def check(budget_ms=DEFAULT_BUDGET_MS, top=10):
+    """
+    Mide el arranque de una sesión de búsqueda y lo compara con el presupuesto.
+
+    Returns:
+        bool: True si el arranque cumple el presupuesto y no carga dependencias prohibidas
+    """
+    baseline = {name for name, *_ in import_profile(('streamlit',))}
+    entries = import_profile(SEARCH_MODULES)
+
+    # Nivel 0 del perfil: cada módulo importado directamente, con todo lo que arrastra
+    total_ms = sum(cumulative for _, _, cumulative, level in entries if level == 0) / 1000
+    forbidden = sorted({_forbidden_package(name) for name, *_ in entries
+                        if _forbidden_package(name) and name not in baseline})
+
+    print(f"Tiempo de importación: {total_ms:.0f} ms (presupuesto {budget_ms:.0f} ms)")
+    print("Módulos más lentos (acumulado):")
+    for name, _, cumulative, _ in sorted(entries, key=lambda e: -e[2])[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    ok = True
+    if total_ms > budget_ms:
+        print(f"ERROR: el arranque supera el presupuesto por {total_ms - budget_ms:.0f} ms")
+        ok = False
+    if forbidden:
+        print("ERROR: la sesión de búsqueda importa dependencias del reporte o de Google Sheets: " + ", ".join(forbidden))
+        ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help="Presupuesto en milisegundos")
+    parser.add_argument('--top', type=int, default=10, help="Cantidad de módulos lentos a mostrar")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.budget, args.top) else 1)
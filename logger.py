@@ -1,123 +1,424 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
 import datetime
 import json
+from usage import UsageCube
 import streamlit as st
 import logging
 import pytz
+import atexit
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# gspread y google-auth se importan recién al hablar con Google Sheets (en el hilo de
+# sincronización o en el reporte), para no cargarlos en el arranque de una sesión de búsqueda
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Cliente de gspread y hojas abiertas, compartidos por todo el proceso
+_client = None
+_worksheets = {}
+_sheets_lock = threading.RLock()
+
+
 def get_gspread_client():
     """
     Obtiene un cliente de gspread autenticado utilizando las credenciales guardadas en Streamlit Secrets.
+
+    El cliente se crea una sola vez por proceso y se reutiliza: mantiene abierta la sesión
+    HTTP y google-auth renueva el token automáticamente cuando vence.
+    """
+    global _client
+    with _sheets_lock:
+        if _client is not None:
+            return _client
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        try:
+            # Obtener credenciales desde secrets.toml
+            service_account_info = st.secrets["gcp_service_account"]
+            
+            # Cargar las credenciales directamente desde el objeto JSON
+            scopes = [
+                "https://www.googleapis.com/auth/spreadsheets",
+                "https://www.googleapis.com/auth/drive"
+            ]
+            
+            credentials = Credentials.from_service_account_info(
+                service_account_info,
+                scopes=scopes
+            )
+            
+            # Crear cliente
+            _client = gspread.authorize(credentials)
+            return _client
+        except Exception as e:
+            logger.error(f"Error al obtener cliente gspread: {str(e)}")
+            raise e
+
+
+def reset_gspread_client(stale=None):
+    """
+    Descarta el cliente y las hojas abiertas para reconectarse en la próxima llamada.
+
+    Args:
+        stale: Si se indica, sólo se descarta si el cliente actual sigue siendo ése (otra
+            llamada que falló a la vez puede haberse reconectado ya)
+    """
+    global _client
+    with _sheets_lock:
+        if stale is not None and _client is not stale:
+            return
+        _client = None
+        _worksheets.clear()
+
+
+def get_worksheet(spreadsheet_id, sheet_name, create=None):
+    """
+    Devuelve la hoja `sheet_name` de la planilla, reutilizando el objeto ya abierto.
+
+    Args:
+        spreadsheet_id (str): ID de la planilla de Google Sheets
+        sheet_name (str): Nombre de la hoja
+        create (callable): Si la hoja no existe se llama create(planilla) para crearla;
+            si es None se devuelve None
+
+    Returns:
+        gspread.Worksheet | None
+    """
+    import gspread
+
+    key = (spreadsheet_id, sheet_name)
+    with _sheets_lock:
+        if key not in _worksheets:
+            sheet = get_gspread_client().open_by_key(spreadsheet_id)
+            try:
+                _worksheets[key] = sheet.worksheet(sheet_name)
+            except gspread.exceptions.WorksheetNotFound:
+                if create is None:
+                    return None
+                _worksheets[key] = create(sheet)
+        return _worksheets[key]
+
+
+def _is_auth_error(e):
+    import google.auth.exceptions
+
+    status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status in (401, 403) or isinstance(e, google.auth.exceptions.RefreshError)
+
+
+def call_sheets(func):
     """
+    Ejecuta una llamada a Google Sheets con el cliente compartido. El lock sólo se toma
+    para obtener o crear el cliente y las hojas, no durante la llamada, así que una
+    lectura lenta no frena a las demás sesiones.
+    Si falla por autenticación, se reconecta y la reintenta una vez.
+    """
+    client = get_gspread_client()
     try:
-        # Obtener credenciales desde secrets.toml
-        service_account_info = st.secrets["gcp_service_account"]
-        
-        # Cargar las credenciales directamente desde el objeto JSON
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
-        credentials = Credentials.from_service_account_info(
-            service_account_info,
-            scopes=scopes
-        )
-        
-        # Crear cliente
-        client = gspread.authorize(credentials)
-        return client
+        return func()
     except Exception as e:
-        logger.error(f"Error al obtener cliente gspread: {str(e)}")
-        raise e
+        if not _is_auth_error(e):
+            raise
+        logger.warning(f"Error de autenticación con Google Sheets, reconectando: {str(e)}")
+        reset_gspread_client(stale=client)
+        return func()
+
+# Nombre de la hoja de logs y sus encabezados
+LOG_SHEET_NAME = "search_logs"
+LOG_HEADERS = [
+    "timestamp", "username", "contains_0", "search_term_0", "logical_1", "contains_1", "search_term_1", "logical_2", "contains_2", "search_term_2", "logical_3", "contains_3", "search_term_3", "considerar_ofertas", "search_query",
+    "proveedores", "record_id"
+]
+# Columna (1-based) con el ID único de cada registro, para no duplicar filas al reenviar
+RECORD_ID_COLUMN = len(LOG_HEADERS)
+
+# Envío en lotes: se escribe al juntar LOG_BATCH_SIZE filas o tras LOG_FLUSH_INTERVAL segundos
+LOG_BATCH_SIZE = 20
+LOG_FLUSH_INTERVAL = 5.0
+# Máximo de filas por llamada a append_rows al reenviar registros atrasados
+LOG_MAX_APPEND = 500
+
+# Registro local donde se guardan las búsquedas antes de enviarlas a Google Sheets
+SPOOL_PATH = Path('search_log_spool.sqlite3')
+# Días que se conservan en el registro local las búsquedas ya enviadas
+SPOOL_KEEP_DAYS = 30
+
+
+def _create_log_worksheet(sheet):
+    """Crea la hoja de logs con sus encabezados."""
+    worksheet = sheet.add_worksheet(title=LOG_SHEET_NAME, rows=1000, cols=20)
+    # Agregar encabezados
+    worksheet.update('A1:Q1', [LOG_HEADERS])
+    return worksheet
+
+
+def get_log_worksheet(spreadsheet_id, create=True):
+    """
+    Devuelve la hoja de logs (reutilizando el objeto ya abierto); si no existe y `create`
+    es verdadero, la crea con sus encabezados.
+    """
+    return get_worksheet(spreadsheet_id, LOG_SHEET_NAME, _create_log_worksheet if create else None)
+
+
+def build_log_row(username, search_params, considerar_ofertas, proveedores):
+    """
+    Arma la fila que se guarda en la hoja de logs para una búsqueda.
+
+    Returns:
+        tuple: (fila, texto legible de la búsqueda)
+    """
+    # Extraer los términos de búsqueda en un formato más legible
+    search_terms = []
+    words = []
+    contains_or_not = []
+    logicals = []
+    for i in range(4):  # Suponiendo que hay 4 cajas de búsqueda
+        term = search_params.get(f'search_{i}', '')
+        logical = search_params.get(f'logical_{i}', '')
+        contains = search_params.get(f'contains_{i}', '')
+        words.append(term)
+        contains_or_not.append(contains)
+        logicals.append(logical)
+        if term:
+            if i == 0:
+                search_terms.append(f"{contains} '{term}'")
+            else:
+                search_terms.append(f"{logical} {contains} '{term}'")
+
+    search_query = " ".join(search_terms)
+    # La búsqueda avanzada reemplaza a las cajas
+    if search_params.get('query', '').strip():
+        search_query = search_params['query'].strip()
+
+    # Preparar datos para el log
+    timestamp = datetime.datetime.now(pytz.timezone("America/Santiago"))#.strftime("%d-%m-%Y %H:%M:%S")
+    timestamp = f'=DATE({timestamp.year},{timestamp.month},{timestamp.day})+TIME({timestamp.hour},{timestamp.minute},{timestamp.second})'
+    log_data = [timestamp, username]
+    for i in range(4):
+        if i > 0:
+          log_data.append(logicals[i])
+        log_data.append(contains_or_not[i])
+        log_data.append(words[i])
+    log_data.append(considerar_ofertas)
+    log_data.append(search_query)
+
+    provs = ", ".join(proveedores)
+    log_data.append(provs)
+    return log_data, search_query
+
+
+class SearchLogSpool:
+    """
+    Registro local de solo agregado (SQLite) para las búsquedas pendientes de enviar.
+
+    Cada búsqueda se guarda con un ID único antes de intentar enviarla, así que no se
+    pierde si Google Sheets está caído o el proceso se reinicia.
+    """
+
+    def __init__(self, path=SPOOL_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " record_id TEXT PRIMARY KEY, created REAL NOT NULL, row TEXT NOT NULL, sent INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spool_pending ON spool (sent, created)")
+
+    def append(self, row):
+        """Guarda una fila y devuelve su ID."""
+        record_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO spool (record_id, created, row) VALUES (?, ?, ?)",
+                               (record_id, time.time(), json.dumps(row, ensure_ascii=False)))
+        return record_id
+
+    def pending(self, limit):
+        """Filas aún no enviadas, de la más antigua a la más nueva, como (ID, fila)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT record_id, row FROM spool WHERE sent = 0 ORDER BY created LIMIT ?", (limit,))
+            return [(record_id, json.loads(row)) for record_id, row in cursor.fetchall()]
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool WHERE sent = 0").fetchone()[0]
+
+    def mark_sent(self, record_ids):
+        """Marca como enviadas las filas indicadas."""
+        with self._lock:
+            self._conn.executemany("UPDATE spool SET sent = 1 WHERE record_id = ?", [(r,) for r in record_ids])
+
+    def prune(self, keep_days=SPOOL_KEEP_DAYS):
+        """Elimina las filas ya enviadas hace más de `keep_days` días."""
+        with self._lock:
+            self._conn.execute("DELETE FROM spool WHERE sent = 1 AND created < ?", (time.time() - keep_days * 86400,))
+
+
+class SearchLogWriter:
+    """
+    Sincronizador en segundo plano del registro local con Google Sheets.
+
+    Las búsquedas se guardan primero en el registro local; un hilo envía las pendientes en
+    lotes con `append_rows` cuando se juntan `batch_size` filas o pasan `flush_interval`
+    segundos. Cada fila lleva su `record_id`: al arrancar, o tras un envío fallido cuyo
+    resultado se desconoce, se leen sólo los IDs ya presentes en la hoja para no duplicarlos.
+    Si varios procesos comparten el registro, sólo el que tiene el candado lo sincroniza.
+    El formato de fecha se aplica una vez a toda la columna A.
+    """
+
+    def __init__(self, spreadsheet_id, spool, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.spreadsheet_id = spreadsheet_id
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._wake = threading.Event()
+        self._prepared = False
+        self._needs_reconcile = True
+        self._last_sync = time.monotonic()
+        self._send_lock = threading.Lock()
+        self._lock_file = None
+        self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row):
+        """Guarda una fila en el registro local y avisa al hilo de envío."""
+        record_id = self.spool.append(row)
+        self._wake.set()
+        return record_id
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                due = time.monotonic() - self._last_sync >= self.flush_interval
+                if self.spool.pending_count() >= self.batch_size or due:
+                    self.sync()
+            except Exception as e:
+                logger.error(f"Error al sincronizar el registro local de búsquedas: {str(e)}")
+
+    def _acquire_sync_lock(self):
+        """Candado entre procesos para que un solo proceso envíe el registro compartido."""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(f"{self.spool.path}.lock", 'a')
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                self._lock_file = None
+                return False
+        return True
+
+    def _prepare(self, worksheet):
+        if self._prepared:
+            return
+        # Encabezado del ID en hojas creadas antes de que existiera la columna
+        header = worksheet.row_values(1)
+        if len(header) < RECORD_ID_COLUMN or header[RECORD_ID_COLUMN - 1] != LOG_HEADERS[-1]:
+            worksheet.update_cell(1, RECORD_ID_COLUMN, LOG_HEADERS[-1])
+        # Formato de día/mes/año hora:minuto:segundo para toda la columna de fecha
+        worksheet.format('A:A', {"numberFormat": {"type": "DATE_TIME", "pattern": "dd/MM/yyyy HH:mm:ss"}})
+        self._prepared = True
+
+    def _reconcile(self, worksheet, pending_ids):
+        """Marca como enviadas las filas pendientes cuyo ID ya está en la hoja."""
+        present = set(worksheet.col_values(RECORD_ID_COLUMN)[1:])
+        already_sent = [r for r in pending_ids if r in present]
+        if already_sent:
+            self.spool.mark_sent(already_sent)
+            logger.info(f"{len(already_sent)} búsquedas ya estaban en Google Sheets")
+        self._needs_reconcile = False
+        return set(already_sent)
+
+    def _append(self, batch):
+        worksheet = get_log_worksheet(self.spreadsheet_id)
+        self._prepare(worksheet)
+        ids = [record_id for record_id, _ in batch]
+        if self._needs_reconcile:
+            already_sent = self._reconcile(worksheet, ids)
+            batch = [(r, row) for r, row in batch if r not in already_sent]
+        if batch:
+            self._needs_reconcile = True  # hasta confirmar el envío
+            worksheet.append_rows([row + [record_id] for record_id, row in batch], value_input_option='USER_ENTERED')
+            self.spool.mark_sent([record_id for record_id, _ in batch])
+            self._needs_reconcile = False
+        return len(batch)
+
+    def sync(self):
+        """Envía a Google Sheets todas las filas pendientes del registro local."""
+        with self._send_lock:
+            if not self._acquire_sync_lock():
+                return 0
+            self._last_sync = time.monotonic()
+            sent = 0
+            while True:
+                batch = self.spool.pending(LOG_MAX_APPEND)
+                if not batch:
+                    break
+                try:
+                    sent += call_sheets(lambda: self._append(batch))
+                except Exception as e:
+                    logger.error(f"Error al registrar {len(batch)} búsquedas en Google Sheets (quedan en el registro local): {str(e)}")
+                    break
+                if len(batch) < LOG_MAX_APPEND:
+                    break
+            if sent:
+                logger.info(f"{sent} búsquedas registradas en Google Sheets")
+                self.spool.prune()
+            return sent
+
+    def flush(self):
+        """Envía de inmediato las filas pendientes (se llama al cerrar el proceso)."""
+        self.sync()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """Devuelve el escritor de logs del proceso, creándolo la primera vez."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SearchLogWriter(st.secrets["url"]["gsheet_id"], SearchLogSpool())
+            atexit.register(_writer.flush)
+        return _writer
+
 
 def log_search(username, search_params, considerar_ofertas, proveedores):
     """
     Registra una búsqueda en una hoja de Google Sheets
+
+    La fila se guarda en el registro local y la envía en segundo plano el escritor
+    de logs, sin bloquear la búsqueda.
     
     Args:
         username (str): Nombre del usuario que realizó la búsqueda
         search_params (dict): Términos de búsqueda y operadores lógicos
         considerar_ofertas (str): Si se consideraron ofertas o no
-        search_time (float): Tiempo que tomó la búsqueda
+        proveedores (list): Proveedores incluidos o excluidos
     """
     try:
-        # Obtener el ID de la hoja de Google Sheets desde Streamlit Secrets
-        spreadsheet_id = st.secrets["url"]["gsheet_id"]
-        
-        # Obtener cliente de gspread
-        client = get_gspread_client()
-        
-        # Abrir la hoja de cálculo
-        sheet = client.open_by_key(spreadsheet_id)
-        
-        # Obtener la hoja donde guardaremos los logs
-        # Si no existe, la creamos
-        sheet_name = "search_logs"
-        try:
-            worksheet = sheet.worksheet(sheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = sheet.add_worksheet(title=sheet_name, rows=1000, cols=20)
-            # Agregar encabezados
-            headers = [
-                "timestamp", "username", "contains_0", "search_term_0", "logical_1", "contains_1", "search_term_1", "logical_2", "contains_2", "search_term_2", "logical_3", "contains_3", "search_term_3", "considerar_ofertas", "search_query",
-                "proveedores"
-            ]
-            worksheet.update('A1:P1', [headers])
-        
-        # Extraer los términos de búsqueda en un formato más legible
-        search_terms = []
-        words = []
-        contains_or_not = []
-        logicals = []
-        for i in range(4):  # Suponiendo que hay 4 cajas de búsqueda
-            term = search_params.get(f'search_{i}', '')
-            logical = search_params.get(f'logical_{i}', '')
-            contains = search_params.get(f'contains_{i}', '')
-            words.append(term)
-            contains_or_not.append(contains)
-            logicals.append(logical)
-            if term:
-                if i == 0:
-                    search_terms.append(f"{contains} '{term}'")
-                else:
-                    search_terms.append(f"{logical} {contains} '{term}'")
-        
-        search_query = " ".join(search_terms)
-        
-        # Preparar datos para el log
-        timestamp = datetime.datetime.now(pytz.timezone("America/Santiago"))#.strftime("%d-%m-%Y %H:%M:%S")
-        timestamp = f'=DATE({timestamp.year},{timestamp.month},{timestamp.day})+TIME({timestamp.hour},{timestamp.minute},{timestamp.second})'
-        log_data = [timestamp, username]
-        for i in range(4):
-            if i > 0:
-              log_data.append(logicals[i])            
-            log_data.append(contains_or_not[i])            
-            log_data.append(words[i])
-        log_data.append(considerar_ofertas)
-        log_data.append(search_query)
-        
-        provs = ", ".join(proveedores)
-        log_data.append(provs)
-            
-        # Agregar una nueva fila con los datos
-        worksheet.append_row(log_data, value_input_option='USER_ENTERED')
-        # Añadir el registro
-
-        # Obtener el número de la última fila añadida
-        ultima_fila = len(worksheet.get_all_values())
-
-        # Aplicar formato de día/mes/año hora:minuto:segundo a la celda de fecha
-        # Esto formatea la visualización pero mantiene el tipo de dato como fecha
-        celda_fecha = f'A{ultima_fila}'  # Asumiendo que la fecha está en la columna A
-        worksheet.format(celda_fecha, {"numberFormat": {"type": "DATE_TIME", "pattern": "dd/MM/yyyy HH:mm:ss"}})
-        
-        logger.info(f"Búsqueda registrada para {username}: {search_query}")
+        log_data, search_query = build_log_row(username, search_params, considerar_ofertas, proveedores)
+        get_log_writer().put(log_data)
+        logger.info(f"Búsqueda guardada para {username}: {search_query}")
         return True
     
     except Exception as e:
@@ -125,43 +426,101 @@ def log_search(username, search_params, considerar_ofertas, proveedores):
         # No detener la aplicación si falla el logging
         return False
 
-def get_search_logs():
+# Segundos durante los que el reporte reutiliza los logs sin consultar filas nuevas
+LOG_CACHE_TTL = 60
+# Cada cuánto se vuelve a leer la hoja completa, por si se editaron filas antiguas
+LOG_CACHE_FULL_REFRESH = 3600
+
+
+def _parse_log_rows(header, rows):
     """
-    Obtiene todos los registros de búsqueda de Google Sheets
-    
+    Convierte filas crudas de la hoja en un DataFrame tipado (timestamp como fecha).
+
+    Las fechas se parsean una sola vez aquí, al leer cada fila por primera vez.
+    """
+    width = len(header)
+    rows = [list(r[:width]) + [''] * (width - len(r)) for r in rows]
+    df = pd.DataFrame(rows, columns=header)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed', dayfirst=True, errors='coerce')
+    return df
+
+
+class SearchLogCache:
+    """
+    Agregado de búsquedas por usuario y hora (UsageCube) de la hoja de logs, compartido
+    por las sesiones de administración. Los reportes sólo leen el agregado, así que no
+    se guarda una copia de las filas.
+
+    Guarda cuántas filas ya se leyeron y, vencido el TTL, pide a Google Sheets sólo el
+    rango de filas nuevas y parsea únicamente esas. Cada LOG_CACHE_FULL_REFRESH segundos
+    vuelve a leer la hoja completa.
+    """
+
+    def __init__(self, ttl=LOG_CACHE_TTL, full_refresh=LOG_CACHE_FULL_REFRESH):
+        self.ttl = ttl
+        self.full_refresh = full_refresh
+        self._lock = threading.Lock()
+        self._header = None
+        self._rows_ingested = 0
+        self._fetched_at = 0.0
+        self._full_at = 0.0
+        self.cube = UsageCube()
+
+    def _full_load(self, spreadsheet_id):
+        # La hoja se pide dentro de la llamada: si se reconecta, el reintento usa el cliente nuevo
+        values = call_sheets(lambda: get_log_worksheet(spreadsheet_id, create=False).get_all_values())
+        self._header = values[0] if values else []
+        self.cube = UsageCube.from_events(_parse_log_rows(self._header, values[1:]))
+        self._rows_ingested = len(values) - 1 if values else 0
+        self._full_at = time.monotonic()
+
+    def _incremental_load(self, spreadsheet_id):
+        from gspread.utils import rowcol_to_a1
+
+        # Rango desde la primera fila aún no leída hasta la última columna del encabezado
+        first_row = self._rows_ingested + 2
+        last_col = rowcol_to_a1(1, len(self._header)).rstrip('0123456789')
+        rows = call_sheets(lambda: get_log_worksheet(spreadsheet_id, create=False).get(f'A{first_row}:{last_col}'))
+        # El desplazamiento cuenta todas las filas leídas, también las vacías, para no releerlas
+        self._rows_ingested += len(rows)
+        rows = [r for r in rows if any(r)]
+        if rows:
+            self.cube.update(_parse_log_rows(self._header, rows))
+
+    def get(self, spreadsheet_id):
+        """
+        Devuelve el agregado de los logs, leyendo de Google Sheets sólo si venció el TTL.
+
+        Returns:
+            UsageCube | None: None si la hoja de logs no existe
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._header is not None and now - self._fetched_at < self.ttl:
+                return self.cube
+            if call_sheets(lambda: get_log_worksheet(spreadsheet_id, create=False)) is None:
+                return None
+            if not self._header or now - self._full_at >= self.full_refresh:
+                self._full_load(spreadsheet_id)
+            else:
+                self._incremental_load(spreadsheet_id)
+            self._fetched_at = now
+            return self.cube
+
+
+_log_cache = SearchLogCache()
+
+
+def get_usage_cube():
+    """
+    Obtiene el agregado de búsquedas por usuario y hora, actualizado con los logs nuevos.
+
     Returns:
-        pandas.DataFrame: DataFrame con los registros de búsqueda
+        UsageCube: Agregado compartido (vacío si no se pudieron leer los logs)
     """
     try:
-        # Obtener el ID de la hoja de Google Sheets desde Streamlit Secrets
-        spreadsheet_id = st.secrets["url"]["gsheet_id"]
-        
-        # Obtener cliente de gspread
-        client = get_gspread_client()
-        
-        # Abrir la hoja de cálculo
-        sheet = client.open_by_key(spreadsheet_id)
-        
-        # Obtener la hoja donde están los logs
-        try:
-            worksheet = sheet.worksheet("search_logs")
-        except gspread.exceptions.WorksheetNotFound:
-            # Si no existe la hoja, devolver DataFrame vacío
-            return pd.DataFrame()
-        
-        # Obtener todos los datos
-        data = worksheet.get_all_records()
-        
-        # Convertir a DataFrame
-        df = pd.DataFrame(data)
-        
-        # Si el DataFrame no está vacío, convertir timestamp a datetime
-        if not df.empty and 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed', dayfirst=True)
-        
-        return df
-    
+        _log_cache.get(st.secrets["url"]["gsheet_id"])
     except Exception as e:
         logger.error(f"Error al obtener logs de Google Sheets: {str(e)}")
-        # Devolver DataFrame vacío en caso de error
-        return pd.DataFrame()
+    return _log_cache.cube
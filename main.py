@@ -7,18 +7,20 @@ st.set_page_config(
     initial_sidebar_state="collapsed")
 
 import pandas as pd
-import os
+import io
 import re
 from pathlib import Path
 import logging
 import time
 import traceback
 import search
-from PIL import Image
-import gdown
+from refresh import CATALOG_REFRESH_INTERVAL, CatalogRefresher
+from display import PRICE_COLUMNS, display_frame
+from schema import apply_schema
+from snapshot import load_catalog
+from store import CatalogStore
+from quote import bulk_quote, parse_quote_text, read_quote_csv
 import warnings
-import requests
-import base64
 from logger import log_search
 
 warnings.filterwarnings("ignore")
@@ -28,12 +30,23 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 
-logo = Image.open('img/logo.jpeg')
-# Calcula el ancho proporcional para mantener la relación de aspecto
-height_ratio = 110 / float(logo.size[1])
-new_width = int(float(logo.size[0]) * height_ratio)
-# Redimensiona la imagen
-resized_logo = logo.resize((new_width, 110), Image.LANCZOS)
+@st.cache_resource
+def load_logo(path='img/logo.jpeg', height=110):
+    """Logo redimensionado y codificado una sola vez por proceso (no en cada recarga)."""
+    from PIL import Image
+
+    logo = Image.open(path)
+    # Calcula el ancho proporcional para mantener la relación de aspecto
+    height_ratio = height / float(logo.size[1])
+    new_width = int(float(logo.size[0]) * height_ratio)
+    # Redimensiona la imagen
+    resized_logo = logo.resize((new_width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized_logo.convert('RGB').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+resized_logo = load_logo()
 col1, col2 = st.columns([1.65, 3])
 with col1:
     st.image(resized_logo)
@@ -48,60 +61,40 @@ def initialize_search_resources(file_path):
     # Enlace de Google Drive
     url = st.secrets["url"]["data"]
 
-    # Descargar el archivo CSV de Google Drive
+    # Usar la copia local del catálogo si sigue vigente; si no, descargar el CSV de Google Drive
     output = 'data.csv'  # Ruta donde quieres guardar el archivo descargado
-    gdown.download(url, output, quiet=False)
-    df = pd.read_csv(output)
-
-    return df
-
-
-# URL del archivo de fuente
-font_url = "https://github.com/jondot/dotfiles/raw/master/.fonts/calibri.ttf"
-
-# Función para descargar y guardar el archivo
-def download_font(url, local_path="calibri.ttf"):
-    if not os.path.exists(local_path):
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(local_path, "wb") as f:
-                f.write(response.content)
-            print(f"Fuente descargada y guardada en {local_path}")
-        else:
-            print(f"Error al descargar la fuente: {response.status_code}")
-            return None
-    return local_path
-
-# Función para convertir el archivo de fuente a base64
-def get_font_base64(file_path):
-    with open(file_path, "rb") as f:
-        font_bytes = f.read()
-    return base64.b64encode(font_bytes).decode()
-
-
-# Descargar y obtener la fuente en base64
-font_path = download_font(font_url)
-if font_path:
-    font_base64 = get_font_base64(font_path)
-    
-    # Aplicar el CSS con @font-face
-    st.markdown(f"""
+
+    def load(known_version):
+        return load_catalog(url, csv_path=output, max_age=CATALOG_REFRESH_INTERVAL, known_version=known_version)
+
+    # Catálogo de solo lectura: normalización e índices se construyen una sola vez por versión
+    # (y se guardan en disco para que los demás procesos los abran con mmap), y las versiones
+    # nuevas se cargan en segundo plano
+    refresher = CatalogRefresher(load, store=CatalogStore())
+    logger.info(f"Catálogo en uso: versión {refresher.version}")
+    return refresher
+
+
+# La fuente se sirve como archivo estático (static/calibri.ttf, ver server.enableStaticServing
+# en .streamlit/config.toml): el navegador la descarga una vez y la guarda en caché
+st.markdown("""
     <style>
-        @font-face {{
+        @font-face {
             font-family: 'Calibri';
-            src: url(data:font/truetype;base64,{font_base64}) format('truetype');
+            src: url(app/static/calibri.ttf) format('truetype');
             font-weight: normal;
             font-style: normal;
-        }}
+            font-display: swap;
+        }
         
-        .stDataEditor {{
+        .stDataEditor {
             font-family: 'Calibri', sans-serif !important;
             font-size: 11px !important;
-        }}
-        .stDataEditor div[data-testid="stDataEditorCell"] {{
+        }
+        .stDataEditor div[data-testid="stDataEditorCell"] {
             font-family: 'Calibri', sans-serif !important;
             font-size: 11px !important;
-        }}
+        }
     </style>
     """, unsafe_allow_html=True)
 
@@ -223,12 +216,20 @@ def main():
     
       if 'skusearch' not in st.session_state:
           st.session_state['skusearch'] = ''
+      if 'advanced_query' not in st.session_state:
+          st.session_state['advanced_query'] = ''
+      # Última búsqueda de la sesión: los refinamientos se evalúan sólo sobre sus filas
+      if 'search_session' not in st.session_state:
+          st.session_state['search_session'] = search.SearchSession()
       
       # Determine file path
       file_path = Path("Datos/datos_app.csv")
       
       # Load resources - CACHED to prevent reloading every time
-      df = initialize_search_resources(file_path)
+      # Se toma el catálogo vigente una vez por ejecución: esta búsqueda usa esa versión
+      # aunque en el intertanto se publique una nueva
+      refresher = initialize_search_resources(file_path)
+      catalog = refresher.current
 
       # Inicializar variables del estado para búsqueda y resultados
       if 'search_results' not in st.session_state:
@@ -236,7 +237,7 @@ def main():
       if 'search_performed' not in st.session_state:
           st.session_state['search_performed'] = False
       if 'all_providers' not in st.session_state:
-          st.session_state['all_providers'] = ['Todos'] + sorted(list(df['Proveedor'].unique()))
+          st.session_state['all_providers'] = ['Todos'] + catalog.providers
       if 'result_providers' not in st.session_state:
           st.session_state['result_providers'] = ['Todos']
       if 'post_search_provider' not in st.session_state:
@@ -308,10 +309,16 @@ def main():
                           #subterm = st.text_input("", value="", key=f'SearchTerm{i}_disabled', disabled=True)
                           st.session_state[f'search_{i}'] = ''
 
+      # Búsqueda avanzada (Y/O/NO y paréntesis); si no está vacía reemplaza a las cajas
+      adv_cols = st.columns([2.5, 9])
+      with adv_cols[0]:
+          consulta_avanzada = st.text_input("", value=st.session_state['advanced_query'], key='AdvancedQuery',
+                                            placeholder='Avanzada: tubo Y (pvc O cobre) NO gris', label_visibility='collapsed')
+          st.session_state['advanced_query'] = consulta_avanzada
           
       col, colr = st.columns([1.5, 1])
       with col:
-          subc = st.columns([1.5, 2, 1.8, 3])
+          subc = st.columns([1.5, 2, 1.8, 1.5, 3])
 
           with subc[0]:              
             considerar_ofertas = ["No", "Sí"]
@@ -322,10 +329,19 @@ def main():
           with subc[-1]:
             incluir_excluir = ["Incluir", "Excluir"]
             seleccion_provs = st.radio("Filtrar proveedor:", incluir_excluir, horizontal=True, label_visibility='collapsed')
-            provs = sorted(list(df['Proveedor'].unique()))
-            buscar_en_prov = st.multiselect('', provs, placeholder='Proveedores', label_visibility='collapsed')
+            provs = catalog.providers
+            # Coincidencias por proveedor de la última búsqueda (conteo por rangos, sin recorrer filas)
+            ultima = st.session_state.get('search_results')
+            conteos = ultima.attrs.get('provider_counts') if isinstance(ultima, pd.DataFrame) \
+                and st.session_state.get('search_version') == catalog.version else None
+            # Clave fija: las etiquetas cambian con los conteos y no deben reiniciar la selección
+            buscar_en_prov = st.multiselect('', provs, placeholder='Proveedores', label_visibility='collapsed',
+                                            key='buscar_en_prov',
+                                            format_func=lambda p: f"{p} ({conteos.get(p, 0)})" if conteos else p)
           with subc[2]:
             mostrar_stock = st.radio("Mostrar productos sin stock:", considerar_ofertas, horizontal=True)
+          with subc[3]:
+            orden = st.selectbox("Ordenar por:", list(search.SORT_OPTIONS))
 
 
       with colr:
@@ -370,6 +386,9 @@ def main():
                 
                 # Clear SKU search
                 st.session_state['skusearch'] = ''
+
+                # Clear advanced query
+                st.session_state['advanced_query'] = ''
                 
                 # Force a rerun to refresh all widgets with cleared values
                 st.rerun()
@@ -379,6 +398,23 @@ def main():
 
                   if ver_datos:
                       st.switch_page("report.py")
+
+                  # Estado de la caché compartida de búsquedas (sólo administradores)
+                  cache_stats = search.result_cache.stats()
+                  st.caption(f"Caché: {cache_stats['hits']} aciertos / {cache_stats['misses']} fallos "
+                             f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} búsquedas, "
+                             f"{cache_stats['bytes'] / 1e6:.1f} MB · catálogo {catalog.version}")
+
+                  # Recargar la lista de precios de un solo proveedor sin rearmar las demás
+                  lista = st.file_uploader("Lista de un proveedor (CSV)", type="csv", key="provider_list")
+                  if lista is not None and st.button("Recargar proveedor"):
+                      lista_df = apply_schema(pd.read_csv(lista, low_memory=False))
+                      proveedores_lista = lista_df['Proveedor'].dropna().unique().tolist() if 'Proveedor' in lista_df else []
+                      if len(proveedores_lista) != 1:
+                          st.error("La lista debe traer un único proveedor en la columna 'Proveedor'")
+                      else:
+                          version = refresher.reload_provider(proveedores_lista[0], lista_df)
+                          st.success(f"{proveedores_lista[0]}: {len(lista_df)} filas (catálogo {version})")
                               
               
       with col2:
@@ -386,14 +422,8 @@ def main():
 
       if boton_sku:
         try:
-          sku_results = df[df['Codigo Prov'] == buscar_sku]
-          st.data_editor(sku_results.reset_index(drop=True).style.format({
-                              "Precio MSM": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "", 
-                              "Precio Oferta": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "", 
-                              "Precio Lista": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "",
-                              'T. Entrega': "{:.0f}",
-                              "Stock": lambda x: f"{float(x):.0f}" if pd.notnull(x) and str(x).strip() and str(x).replace('.', '', 1).isdigit() else x
-                          }), 
+          sku_results = catalog.display(catalog.lookup_sku(buscar_sku), drop=())
+          st.data_editor(sku_results.reset_index(drop=True), 
                           height=690, 
                           use_container_width=True, 
                           column_config={"Codigo Prov": st.column_config.LinkColumn("Codigo Prov", width=110), "Descripcion": st.column_config.TextColumn("Descripcion", width=420), "Stock": st.column_config.TextColumn("Stock", width=100),
@@ -401,6 +431,34 @@ def main():
                           disabled=True)
         except:
             pass
+
+      # Cotización masiva: muchos códigos de proveedor resueltos en una sola pasada
+      with st.expander("Cotización masiva"):
+          qcols = st.columns([2, 1])
+          with qcols[0]:
+              codigos_pegados = st.text_area("Códigos (uno por línea; la cantidad, si se indica, separada por tabulador, ';' o 'x'):", key='bulk_codes', height=150)
+          with qcols[1]:
+              archivo_codigos = st.file_uploader("O sube un CSV con encabezados (Codigo Prov, Cantidad):", type=['csv', 'txt'], key='bulk_file')
+          if st.button("Cotizar", key='bulk_quote'):
+              try:
+                  if archivo_codigos is not None:
+                      items = read_quote_csv(archivo_codigos)
+                  else:
+                      items = parse_quote_text(codigos_pegados)
+                  cotizacion, no_encontrados, total = bulk_quote(catalog, items, seleccion_ofertas)
+                  st.write(f"**Total: ${int(total):,}**".replace(",", ".") + f" ({len(cotizacion)} productos)")
+                  if no_encontrados:
+                      st.warning(f"{len(no_encontrados)} códigos no encontrados: " + ", ".join(no_encontrados[:50]))
+                  st.data_editor(display_frame(cotizacion, PRICE_COLUMNS + ('Precio Unitario', 'Subtotal')),
+                                  use_container_width=True,
+                                  column_config={"Codigo Prov": st.column_config.LinkColumn("Codigo Prov", width=110), "Descripcion": st.column_config.TextColumn("Descripcion", width=420), "Stock": st.column_config.TextColumn("Stock", width=100),
+                                  "Comentario": st.column_config.TextColumn("Comentario", width=200), "Url": st.column_config.LinkColumn("Url", width=100)},
+                                  disabled=True)
+              except Exception as e:
+                  st.error(f"Error al cotizar: {str(e)}")
+                  logger.error(f"Quote error: {e}")
+                  logger.error(traceback.format_exc())
+
       # Display results
       #if search_clicked or search_term:
       if search_clicked:
@@ -413,13 +471,15 @@ def main():
                       search_params[f'search_{i}'] = st.session_state.get(f'search_{i}', '')
                       search_params[f'logical_{i}'] = st.session_state.get(f'logical_{i}', '')
                       search_params[f'contains_{i}'] = st.session_state.get(f'contains_{i}', '')
+                  search_params['query'] = st.session_state.get('advanced_query', '')
 
 
                   # Realizar la búsqueda
-                  search_results = search.key_search(nsearch_boxes, st.session_state, df, seleccion_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock)
+                  search_results = search.key_search(nsearch_boxes, st.session_state, catalog, seleccion_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock, st.session_state['advanced_query'], orden, search.RELEVANCE_LIMIT, st.session_state['search_session'])
 
                   # Guardar resultados en el estado de la sesión
                   st.session_state['search_results'] = search_results
+                  st.session_state['search_version'] = search_results.attrs.get('version', catalog.version)
                   st.session_state['search_performed'] = True
                   st.session_state['current_page'] = 1
                   # Actualizar la lista de proveedores disponibles en los resultados
@@ -463,6 +523,10 @@ def main():
               
               with subc[-3]:
                   st.write(f"Página {st.session_state.current_page}/{total_pages}")
+              total_coincidencias = filtered_df.attrs.get('total', len(filtered_df))
+              if total_coincidencias > len(filtered_df):
+                  with subc[0]:
+                      st.caption(f"Los {len(filtered_df)} más relevantes de {total_coincidencias}")
               with subc[-2]:
                   if st.button("←") and st.session_state.current_page > 1:
                     st.session_state.current_page -= 1
@@ -474,15 +538,14 @@ def main():
 
                             
               if not filtered_results.empty:
-                               
+
+                # Columnas ya formateadas al cargar el catálogo (el índice es la fila del CSV)
+                if st.session_state.get('search_version') == catalog.version:
+                    pagina = catalog.display(catalog.positions(filtered_results.index))
+                else:
+                    pagina = display_frame(filtered_results)
                 st.data_editor(
-                    filtered_results.reset_index(drop=True).style.format({
-                        "Precio MSM": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "", 
-                        "Precio Oferta": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "", 
-                        "Precio Lista": lambda x: f"{int(x):,}".replace(",", ".") if pd.notnull(x) and x > 0 else "",
-                        'T. Entrega': "{:.0f}",
-                        "Stock": lambda x: f"{float(x):.0f}" if pd.notnull(x) and str(x).strip() and str(x).replace('.', '', 1).isdigit() else x
-                    }), 
+                    pagina.reset_index(drop=True), 
                     height=690, 
                     use_container_width=True, 
                     column_config={"Codigo Prov": st.column_config.LinkColumn("Codigo Prov", width=110), "Descripcion": st.column_config.TextColumn("Descripcion", width=420), "Stock": st.column_config.TextColumn("Stock", width=100),
@@ -0,0 +1,330 @@
+import re
+
+import numpy as np
+
+from text_index import difference_sorted, intersect_sorted, is_literal
+
+# Operadores aceptados en la búsqueda avanzada (en mayúsculas, para no confundirlos con palabras)
+AND_WORDS = {'Y', 'AND'}
+OR_WORDS = {'O', 'OR'}
+NOT_WORDS = {'NO', 'NOT'}
+
+_TOKEN = re.compile(r'\(|\)|"[^"]*"?|[^\s()"]+')
+
+
+class QuerySyntaxError(ValueError):
+    """Error de sintaxis en una búsqueda avanzada."""
+
+
+class Term:
+    """Término de búsqueda: filas cuyo texto contiene `text` como subcadena."""
+
+    def __init__(self, text):
+        self.text = text.lower()
+
+    def __repr__(self):
+        return f'Term({self.text!r})'
+
+
+class Not:
+    """Negación: filas que no cumplen `child`."""
+
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f'Not({self.child!r})'
+
+
+class And:
+    """Conjunción: filas que cumplen todos los `children`."""
+
+    def __init__(self, children):
+        self.children = list(children)
+
+    def __repr__(self):
+        return f'And({self.children!r})'
+
+
+class Or:
+    """Disyunción: filas que cumplen al menos uno de los `children`."""
+
+    def __init__(self, children):
+        self.children = list(children)
+
+    def __repr__(self):
+        return f'Or({self.children!r})'
+
+
+def _combine(cls, left, right):
+    """Une dos nodos aplanando operadores iguales, p. ej. And(And(a, b), c) -> And(a, b, c)."""
+    children = []
+    for node in (left, right):
+        children.extend(node.children if isinstance(node, cls) else [node])
+    return cls(children)
+
+
+def parse_query(text):
+    """
+    Interpreta una búsqueda avanzada.
+
+    Sintaxis:
+        - Términos sueltos o frases entre comillas: tubo "llave de paso"
+        - Operadores Y/AND, O/OR y NO/NOT (en mayúsculas); dos términos seguidos equivalen a Y
+        - Un guion delante de un término lo niega: -gris
+        - Paréntesis para agrupar: tubo Y (pvc O cobre) NO gris
+
+    Returns:
+        Term | Not | And | Or | None: Árbol de la consulta, o None si el texto está vacío
+
+    Raises:
+        QuerySyntaxError: Si la consulta está mal formada
+    """
+    tokens = _TOKEN.findall(text or '')
+    if not tokens:
+        return None
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def advance():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() in OR_WORDS:
+            advance()
+            node = _combine(Or, node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_unary()
+        while peek() is not None and peek() != ')' and peek() not in OR_WORDS:
+            if peek() in AND_WORDS:
+                advance()
+            node = _combine(And, node, parse_unary())
+        return node
+
+    def parse_unary():
+        token = peek()
+        if token in NOT_WORDS:
+            advance()
+            return Not(parse_unary())
+        if token == '-':
+            advance()
+            return Not(parse_atom())
+        if token is not None and token.startswith('-'):
+            advance()
+            return Not(_term(token[1:]))
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None:
+            raise QuerySyntaxError("La búsqueda termina con un operador")
+        if token == '(':
+            advance()
+            node = parse_or()
+            if peek() != ')':
+                raise QuerySyntaxError("Falta cerrar un paréntesis")
+            advance()
+            return node
+        if token == ')' or token in AND_WORDS or token in OR_WORDS:
+            raise QuerySyntaxError(f"Operador inesperado: {token}")
+        return _term(advance())
+
+    def _term(token):
+        if token.startswith('"'):
+            token = token.strip('"')
+        if token == '':
+            raise QuerySyntaxError("Frase vacía entre comillas")
+        return Term(token)
+
+    node = parse_or()
+    if pos != len(tokens):
+        raise QuerySyntaxError(f"Operador inesperado: {tokens[pos]}")
+    return node
+
+
+def from_boxes(nsearch, options):
+    """
+    Compila las cajas de búsqueda de la interfaz en un árbol de consulta.
+
+    Las cajas se combinan de izquierda a derecha, igual que antes:
+    ((caja0 op1 caja1) op2 caja2) op3 caja3.
+
+    Returns:
+        Term | Not | And | Or | None: None si la primera caja está vacía
+    """
+    if options[f'search_{0}'].strip() == '':
+        return None
+
+    def box(i):
+        term = Term(options[f'search_{i}'])
+        return term if options[f'contains_{i}'] == 'Contiene' else Not(term)
+
+    node = box(0)
+    for i in range(1, nsearch):
+        if options[f'search_{i}'] == '':
+            break
+        if options[f'logical_{i}'] == 'Y':
+            node = _combine(And, node, box(i))
+        elif options[f'logical_{i}'] == 'O':
+            node = _combine(Or, node, box(i))
+    return node
+
+
+def positive_terms(node):
+    """Textos de los términos que la consulta busca (los que no están negados)."""
+    if isinstance(node, Term):
+        return [node.text]
+    if isinstance(node, Not):
+        return []
+    return [text for child in node.children for text in positive_terms(child)]
+
+
+def implies(node, other):
+    """
+    Indica si toda fila que cumple `node` cumple también `other` (p. ej. "tubo pvc" implica
+    "tubo", y "tubos" implica "tubo"). Es una comprobación conservadora: un False sólo
+    significa que no se pudo demostrar.
+    """
+    if repr(node) == repr(other):
+        return True
+    if isinstance(other, And):
+        return all(implies(node, c) for c in other.children)
+    if isinstance(node, Or):
+        return all(implies(c, other) for c in node.children)
+    if isinstance(node, And) and any(implies(c, other) for c in node.children):
+        return True
+    if isinstance(other, Or) and any(implies(node, c) for c in other.children):
+        return True
+    if isinstance(node, Term) and isinstance(other, Term):
+        # Un texto que contiene el término más largo contiene también su subcadena
+        return is_literal(node.text) and is_literal(other.text) and other.text in node.text
+    if isinstance(node, Not) and isinstance(other, Not):
+        return implies(other.child, node.child)
+    return False
+
+
+def estimate(node, catalog, column):
+    """
+    Estimación del número de filas que cumple un nodo, usada para ordenar la evaluación.
+    """
+    n = len(catalog)
+    if isinstance(node, Term):
+        return catalog.estimate(column, node.text)
+    if isinstance(node, Not):
+        return n - estimate(node.child, catalog, column)
+    if isinstance(node, And):
+        return min(estimate(c, catalog, column) for c in node.children)
+    return min(n, sum(estimate(c, catalog, column) for c in node.children))
+
+
+def _uses_index(node, catalog, column):
+    """Indica si el nodo se puede resolver sólo con índices (sin recorrer texto)."""
+    if isinstance(node, Term):
+        return catalog.is_indexable(column, node.text)
+    if isinstance(node, Not):
+        return _uses_index(node.child, catalog, column)
+    return all(_uses_index(c, catalog, column) for c in node.children)
+
+
+def plan(node, catalog, column):
+    """
+    Ordena los hijos de cada Y de más a menos selectivo (y los que requieren recorrer
+    texto al final), para que los términos siguientes se evalúen sólo sobre las filas
+    que sobreviven.
+    """
+    if isinstance(node, Not):
+        return Not(plan(node.child, catalog, column))
+    if isinstance(node, (And, Or)):
+        children = [plan(c, catalog, column) for c in node.children]
+        if isinstance(node, And):
+            children.sort(key=lambda c: (not _uses_index(c, catalog, column), estimate(c, catalog, column)))
+        return type(node)(children)
+    return node
+
+
+def _scan_terms(node, catalog, column):
+    """Términos literales de la consulta que el índice no puede acotar (hay que recorrer el texto)."""
+    if isinstance(node, Term):
+        text = node.text
+        return {text} if is_literal(text) and not catalog.is_indexable(column, text) else set()
+    if isinstance(node, Not):
+        return _scan_terms(node.child, catalog, column)
+    return set().union(*(_scan_terms(c, catalog, column) for c in node.children))
+
+
+class _Scans:
+    """
+    Resultados de los términos que se resuelven recorriendo el texto.
+
+    La primera vez que uno de ellos se evalúa sobre muchas filas se buscan todos los
+    pendientes juntos sobre el buffer de la columna (MultiPatternMatcher), sólo en el
+    tramo de las filas candidatas de la consulta (`rows`, que contiene a todas las que
+    se evalúan después), y se guardan sus filas; con pocas filas conviene revisar sólo ésas.
+    """
+
+    def __init__(self, terms, rows):
+        self.pending = set(terms)
+        self.rows = rows
+        self.found = {}
+
+    def find(self, catalog, column, text, rows):
+        if text not in self.found and text in self.pending and len(rows) > len(self.rows) // 8:
+            self.found.update(catalog.find_many(column, self.pending, self.rows))
+            self.pending.clear()
+        if text in self.found:
+            return intersect_sorted(rows, self.found[text])
+        return catalog.find(column, text, rows)
+
+
+def evaluate(node, catalog, column, rows, scans=None):
+    """
+    Evalúa un árbol de consulta restringido a `rows`.
+
+    Args:
+        node: Árbol de la consulta (ya planificado)
+        catalog (Catalog): Catálogo de productos
+        column (str): Columna de texto donde buscar
+        rows (numpy.ndarray): Posiciones candidatas, ordenadas
+        scans (_Scans): Términos a recorrer en una sola pasada; None para buscar uno por uno
+
+    Returns:
+        numpy.ndarray: Posiciones de `rows` que cumplen la consulta, ordenadas
+    """
+    if len(rows) == 0:
+        return rows
+    if isinstance(node, Term):
+        if scans is not None:
+            return scans.find(catalog, column, node.text, rows)
+        return catalog.find(column, node.text, rows)
+    if isinstance(node, Not):
+        return difference_sorted(rows, evaluate(node.child, catalog, column, rows, scans))
+    if isinstance(node, And):
+        for child in node.children:
+            rows = evaluate(child, catalog, column, rows, scans)
+            if len(rows) == 0:
+                break
+        return rows
+    # Or: cada alternativa sólo se evalúa sobre las filas que aún no coinciden
+    matched = rows[:0]
+    remaining = rows
+    for child in node.children:
+        found = evaluate(child, catalog, column, remaining, scans)
+        if len(found):
+            matched = np.union1d(matched, found)
+            remaining = difference_sorted(remaining, found)
+        if len(remaining) == 0:
+            break
+    return matched
+
+
+def run(node, catalog, column, rows):
+    """Planifica y evalúa una consulta sobre las filas candidatas."""
+    planned = plan(node, catalog, column)
+    return evaluate(planned, catalog, column, rows, _Scans(_scan_terms(planned, catalog, column), rows))
@@ -0,0 +1,130 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from text_index import normalize_code
+
+# Separadores entre código y cantidad que no se confunden con una coma decimal
+_FIELD_SEPARATORS = re.compile(r'[\t;]')
+
+# Cantidad indicada con 'x' al final de la línea: "AB-123 x 5", "AB-123 x2,5"
+_TIMES_QUANTITY = re.compile(r'^(.*\S)\s+[xX]\s*(\d+(?:[.,]\d+)?)$')
+
+
+def parse_quote_text(text):
+    """
+    Interpreta una lista de códigos pegada por el usuario, una línea por producto.
+
+    Cada línea puede traer sólo el código o el código y la cantidad, separados por
+    tabulador, punto y coma, coma o una 'x' ("AB-123 x 5"). Con coma, el código es lo que
+    está antes de la primera y la cantidad el resto, que puede traer coma decimal
+    ("AB-123,2,5"). Un número al final separado sólo por un espacio se considera parte
+    del código ("AB 123"). Sin cantidad se asume 1.
+
+    Returns:
+        pandas.DataFrame: Columnas 'Codigo Prov' y 'Cantidad'
+
+    >>> parse_quote_text('12345,3\\nAB-1;2,5\\nAB 123 x 4\\nAB 123').values.tolist()
+    [['12345', '3'], ['AB-1', '2,5'], ['AB 123', '4'], ['AB 123', 1]]
+    """
+    codes, quantities = [], []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in _FIELD_SEPARATORS.split(line) if p.strip()]
+        if len(parts) == 1:
+            times = _TIMES_QUANTITY.match(line)
+            if times:
+                parts = list(times.groups())
+            else:
+                parts = [p.strip() for p in line.split(',', 1) if p.strip()] or [line]
+        codes.append(parts[0])
+        quantities.append(parts[1] if len(parts) > 1 else 1)
+    return pd.DataFrame({'Codigo Prov': codes, 'Cantidad': quantities})
+
+
+def read_quote_csv(file):
+    """
+    Lee un CSV subido con los códigos a cotizar.
+
+    Si la primera línea trae el encabezado 'Codigo Prov' se usan las columnas 'Codigo
+    Prov' y 'Cantidad'; si no, el archivo no tiene encabezado y se toma la primera
+    columna como código y la segunda (si la hay) como cantidad.
+
+    Returns:
+        pandas.DataFrame: Columnas 'Codigo Prov' y 'Cantidad'
+
+    >>> read_quote_csv(io.BytesIO(b'AB-1\\nAB-2\\n'))['Codigo Prov'].tolist()
+    ['AB-1', 'AB-2']
+    """
+    content = file.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig', errors='replace')
+    lines = content.splitlines()
+    first = lines[0] if lines else ''
+    sep = max(('\t', ';', ','), key=first.count)
+    header = 0 if 'Codigo Prov' in (f.strip().strip('"') for f in first.split(sep)) else None
+    data = pd.read_csv(io.StringIO(content), dtype=str, sep=sep, header=header)
+    code_col = 'Codigo Prov' if 'Codigo Prov' in data.columns else data.columns[0]
+    if 'Cantidad' in data.columns:
+        qty = data['Cantidad']
+    elif len(data.columns) > 1:
+        qty = data[data.columns[1]]
+    else:
+        qty = 1
+    return pd.DataFrame({'Codigo Prov': data[code_col], 'Cantidad': qty})
+
+
+def bulk_quote(catalog, items, considerar_ofertas="No"):
+    """
+    Cotiza una lista de códigos de proveedor en una sola pasada vectorizada.
+
+    Cada código se cruza con el catálogo por su código normalizado. Si un código aparece
+    en varias filas se usa la de menor precio válido.
+
+    Args:
+        catalog (Catalog): Catálogo de productos
+        items (pandas.DataFrame): Columnas 'Codigo Prov' y 'Cantidad'
+        considerar_ofertas (str): "Sí" para cotizar con el menor entre precio y oferta
+
+    Returns:
+        tuple: (DataFrame de la cotización, lista de códigos no encontrados, total)
+    """
+    # La oferta sólo cuenta donde hay una (> 0); un 0 o vacío en "Precio Oferta" no es un precio
+    if considerar_ofertas == "Sí":
+        unit_prices = np.where(catalog.has_offer, np.fmin(catalog.price, catalog.offer), catalog.price)
+    else:
+        unit_prices = catalog.price
+
+    # Mejor fila por código: primero las de precio válido de menor precio unitario, luego el resto
+    valid = catalog.ordered(catalog.price_valid, 'precio')
+    rows = np.concatenate([
+        valid[np.argsort(unit_prices[valid], kind='stable')],
+        catalog.ordered(~catalog.price_valid, 'precio'),
+    ])
+    best = pd.DataFrame({'_code': catalog.sku_index.codes[rows], '_row': rows})
+    best = best[best['_code'] != ''].drop_duplicates('_code')
+
+    request = pd.DataFrame({
+        '_code': [normalize_code(c) for c in items['Codigo Prov']],
+        'Cantidad': pd.to_numeric(items['Cantidad'].astype(str).str.replace(',', '.'), errors='coerce')
+                    if 'Cantidad' in items else 1,
+    })
+    request['Cantidad'] = request['Cantidad'].fillna(1)
+    merged = request.merge(best, on='_code', how='left', sort=False)
+
+    found = merged['_row'].notna().to_numpy()
+    unmatched = items['Codigo Prov'][~found].astype(str).tolist()
+
+    matched = merged[found]
+    matched_rows = matched['_row'].to_numpy(dtype=np.int64)
+    quote = catalog.take(matched_rows).reset_index(drop=True)
+    quote.insert(0, 'Cantidad', matched['Cantidad'].to_numpy())
+    quote['Precio Unitario'] = np.where(catalog.price_valid[matched_rows], unit_prices[matched_rows], np.nan)
+    quote['Subtotal'] = quote['Cantidad'] * quote['Precio Unitario']
+
+    total = float(np.nansum(quote['Subtotal'].to_numpy(dtype=float)))
+    return quote, unmatched, total
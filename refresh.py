@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+
+from catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se consulta si hay una versión nueva del catálogo
+CATALOG_REFRESH_INTERVAL = 600
+
+
+class CatalogRefresher:
+    """
+    Mantiene el catálogo vigente y lo actualiza en segundo plano.
+
+    Un hilo consulta cada `interval` segundos si hay una versión nueva; si la hay, arma el
+    Catalog nuevo (normalización e índices) fuera de las peticiones y lo publica con una
+    sola asignación. Cada búsqueda toma `current` al empezar y usa ese objeto hasta el
+    final, de modo que las que estaban en curso terminan con la versión con la que
+    empezaron, y el catálogo anterior se libera cuando ya nadie lo usa.
+
+    Al armar una versión nueva se reutilizan los fragmentos de los proveedores cuya lista
+    no cambió. Con un CatalogStore, además, cada versión se arma una sola vez en toda la
+    máquina: se guarda en disco y todos los procesos la abren con mmap, de modo que un
+    proceso nuevo está listo sin normalizar ni indexar nada. Lo mismo vale para la lista
+    de un proveedor recargada en un proceso: los demás la toman del almacén en su
+    siguiente consulta.
+    """
+
+    def __init__(self, load, interval=CATALOG_REFRESH_INTERVAL, start=True, store=None):
+        """
+        Args:
+            load (callable): load(versión_actual) -> (DataFrame | None, versión); devuelve
+                None en lugar del DataFrame si la versión no cambió
+            interval (float): Segundos entre consultas
+            start (bool): Iniciar el hilo de actualización
+            store (CatalogStore): Catálogos ya armados en disco, compartidos entre procesos
+        """
+        self._load = load
+        self.interval = interval
+        self._store = store
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Partir del último catálogo guardado; sólo se arma uno si la versión cambió
+        catalog = store.latest() if store is not None else None
+        df, version = load(catalog.source if catalog is not None else None)
+        if df is not None:
+            catalog = self._build(df, version, previous=catalog)
+        self._current = catalog
+        # Versión de origen (la del CSV); las recargas por proveedor no la cambian
+        self._source_version = version
+        self.checked_at = time.time()
+        self.swapped_at = self.checked_at
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="catalog-refresher", daemon=True)
+            self._thread.start()
+
+    @property
+    def current(self):
+        """Catálogo vigente (una búsqueda debe tomarlo una vez y usar siempre el mismo)."""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error al actualizar el catálogo: {str(e)}")
+
+    def refresh(self):
+        """
+        Consulta si hay una versión nueva del CSV o, si no, una recarga de proveedor hecha
+        en otro proceso, y la publica.
+
+        Returns:
+            bool: True si se cambió de versión
+        """
+        with self._lock:
+            df, version = self._load(self._source_version)
+            self.checked_at = time.time()
+            if df is not None and version != self._source_version:
+                catalog = self._build(df, version, previous=self._current)
+                self._source_version = version
+            else:
+                catalog = self._saved_reload()
+                if catalog is None:
+                    return False
+            previous = self._current.version
+            self._current = catalog
+            self.swapped_at = time.time()
+        logger.info(f"Catálogo actualizado: versión {previous} -> {catalog.version}")
+        return True
+
+    def _saved_reload(self):
+        """
+        El catálogo más reciente del almacén si es una recarga de proveedor del mismo CSV
+        que el vigente (guardada por otro proceso); si no, None.
+        """
+        if self._store is None:
+            return None
+        newest = self._store.newest()
+        if newest is None:
+            return None
+        version, source = newest
+        if version == self._current.version or source != self._source_version:
+            return None
+        return self._store.open(version)
+
+    def _build(self, df, version, previous=None):
+        """
+        Catálogo de `version`. Con un almacén se usa el que ya haya guardado otro proceso;
+        si no hay, se arma, se guarda y se devuelve la copia abierta con mmap.
+        """
+        if self._store is None:
+            return Catalog(df, version, previous=previous)
+        saved = self._store.open(version)
+        if saved is not None:
+            return saved
+        return self._save(Catalog(df, version, previous=previous))
+
+    def _save(self, catalog):
+        """Guarda `catalog` en el almacén y devuelve la copia abierta con mmap (o él mismo si falla)."""
+        try:
+            self._store.save(catalog)
+            return self._store.open(catalog.version) or catalog
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el catálogo armado: {str(e)}")
+            return catalog
+
+    def reload_provider(self, provider, df):
+        """
+        Reemplaza la lista de precios de un proveedor y publica el catálogo resultante,
+        reutilizando los fragmentos de los demás proveedores.
+
+        Con un almacén, la versión nueva se guarda en disco: los demás procesos la toman en
+        su siguiente consulta y un proceso nuevo la abre al arrancar. Se parte de la última
+        recarga guardada por otro proceso, si la hay, para no descartarla. El cambio dura
+        hasta que se publique una versión nueva del CSV completo.
+
+        Args:
+            provider (str): Proveedor cuya lista se reemplaza
+            df (pandas.DataFrame): Filas nuevas del proveedor (mismas columnas que el catálogo)
+
+        Returns:
+            str: Versión del catálogo publicado
+        """
+        with self._lock:
+            base = self._saved_reload() or self._current
+            catalog = base.with_provider(provider, df)
+            if self._store is not None:
+                catalog = self._save(catalog)
+            previous = self._current.version
+            self._current = catalog
+            self.swapped_at = time.time()
+        logger.info(f"Lista de {provider} recargada ({len(df)} filas): versión {previous} -> {catalog.version}")
+        return catalog.version
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,210 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Palabras del texto: secuencias de letras, dígitos o guion bajo
+WORD = re.compile(r'\w+')
+
+# Parámetros de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Palabras en minúsculas de `text`."""
+    return WORD.findall(text.lower())
+
+
+class Bm25Index:
+    """
+    Estadísticas de términos de una columna de texto para ordenar por relevancia (BM25).
+
+    Se calculan una vez al cargar el catálogo: vocabulario ordenado, listas de
+    (fila, frecuencia) por palabra y largo de cada fila. Como la búsqueda es por
+    subcadena, cada palabra de la consulta puntúa con todas las palabras del
+    vocabulario que empiezan con ella ("cable" también puntúa "cables").
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        """
+        Args:
+            texts (iterable): Textos de la columna en minúsculas, en el orden de las filas
+            k1, b (float): Parámetros de BM25
+        """
+        self.k1 = k1
+        self.b = b
+        words = pd.Series(texts, dtype=object).str.findall(WORD.pattern).explode().dropna()
+        self.n_rows = len(texts)
+
+        rows = words.index.to_numpy(dtype=np.int64)
+        codes, vocabulary = pd.factorize(words.to_numpy(dtype=object), sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+
+        # Frecuencia de cada palabra por fila, ordenada por (palabra, fila)
+        keys, tf = np.unique(codes.astype(np.int64) * max(self.n_rows, 1) + rows, return_counts=True)
+        self._rows = keys % max(self.n_rows, 1)
+        self._tf = tf.astype(float)
+        self._starts = np.searchsorted(keys // max(self.n_rows, 1), np.arange(len(self.vocabulary) + 1))
+
+        # Frecuencia de documento de cada palabra del vocabulario usada como prefijo (filas con
+        # alguna palabra que empieza con ella) y, para cada par (palabra, fila), la palabra
+        # anterior de esa fila; con esto no se cuentan filas repetidas al consultar
+        self._previous = self._previous_words()
+        self.doc_freq = self._prefix_frequencies()
+
+        self.lengths = np.bincount(rows, minlength=self.n_rows).astype(float)
+
+    def _previous_words(self):
+        """
+        Para cada par (palabra, fila) de las listas, la palabra anterior (en el orden del
+        vocabulario) que tiene la misma fila, o -1 si es la primera.
+        """
+        words = self._posting_words()
+        order = np.lexsort((words, self._rows))
+        previous = np.full(len(words), -1, dtype=np.int32)
+        same_row = self._rows[order][1:] == self._rows[order][:-1]
+        previous[order[1:][same_row]] = words[order][:-1][same_row]
+        return previous
+
+    def _posting_words(self):
+        """Palabra (posición en el vocabulario) de cada par (palabra, fila) de las listas."""
+        return np.repeat(np.arange(len(self.vocabulary), dtype=np.int32), np.diff(self._starts))
+
+    def _prefix_frequencies(self):
+        """Frecuencia de documento de cada palabra del vocabulario como prefijo."""
+        doc_freq = np.diff(self._starts).astype(np.int64)
+        if len(self.vocabulary) == 0:
+            return doc_freq
+        ends = np.searchsorted(self.vocabulary, self.vocabulary + '\U0010ffff', side='left')
+        # Sólo las palabras que son prefijo de otras abarcan más de una lista
+        for v in np.flatnonzero(ends > np.arange(len(self.vocabulary)) + 1):
+            doc_freq[v] = self._count_rows(v, ends[v])
+        return doc_freq
+
+    def _count_rows(self, lo, hi):
+        """Filas distintas con alguna palabra entre las posiciones `lo` y `hi` del vocabulario."""
+        return int(np.count_nonzero(self._previous[self._starts[lo]:self._starts[hi]] < lo))
+
+    def _word_range(self, word):
+        """Rango de posiciones del vocabulario con las palabras que empiezan con `word`."""
+        lo = np.searchsorted(self.vocabulary, word, side='left')
+        hi = np.searchsorted(self.vocabulary, word + '\U0010ffff', side='left')
+        return self._starts[lo], self._starts[hi]
+
+    def document_frequency(self, word):
+        """
+        Cantidad de filas con alguna palabra que empieza con `word`: precalculada si `word`
+        está en el vocabulario; si no, contada sobre las listas sin repetir filas.
+        """
+        lo = np.searchsorted(self.vocabulary, word, side='left')
+        if lo < len(self.vocabulary) and self.vocabulary[lo] == word:
+            return int(self.doc_freq[lo])
+        return self._count_rows(lo, np.searchsorted(self.vocabulary, word + '\U0010ffff', side='left'))
+
+    def term_frequencies(self, word, rows):
+        """Apariciones de palabras que empiezan con `word` en cada fila de `rows`."""
+        start, end = self._word_range(word)
+        if start == end:
+            return np.zeros(len(rows), dtype=float)
+        return np.bincount(self._rows[start:end], weights=self._tf[start:end], minlength=self.n_rows)[rows]
+
+
+class ShardedBm25:
+    """
+    BM25 de una columna repartida en fragmentos contiguos de filas (uno por proveedor).
+
+    Cada fragmento guarda sus propias listas de frecuencias; las estadísticas globales
+    (cantidad de filas, filas por palabra y largo promedio) se combinan al puntuar, de
+    modo que el puntaje es el mismo que con un único índice y sólo se leen las
+    frecuencias por fila de los fragmentos que tienen filas a puntuar.
+    """
+
+    def __init__(self, indexes, offsets, k1=BM25_K1, b=BM25_B):
+        """
+        Args:
+            indexes (list): Bm25Index de cada fragmento, en el orden de las filas
+            offsets (numpy.ndarray): Posición global de la primera fila de cada fragmento
+        """
+        self.k1 = k1
+        self.b = b
+        self.indexes = list(indexes)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_rows = sum(index.n_rows for index in self.indexes)
+        self._bounds = np.append(self.offsets, self.n_rows)
+        total_length = sum(index.lengths.sum() for index in self.indexes)
+        self.average = total_length / self.n_rows if self.n_rows and total_length > 0 else 1.0
+
+    def scores(self, words, rows):
+        """
+        Puntaje BM25 de las filas `rows` para las palabras de la consulta.
+
+        Args:
+            words (iterable): Palabras de la consulta, en minúsculas
+            rows (numpy.ndarray): Posiciones globales de fila a puntuar (ordenadas)
+
+        Returns:
+            numpy.ndarray: Puntaje de cada fila de `rows` (0 si no contiene ninguna palabra)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        total = np.zeros(len(rows), dtype=float)
+        cuts = np.searchsorted(rows, self._bounds)
+        parts = [(index, slice(cuts[i], cuts[i + 1]), rows[cuts[i]:cuts[i + 1]] - self.offsets[i])
+                 for i, index in enumerate(self.indexes) if cuts[i] < cuts[i + 1]]
+        for word in words:
+            df = sum(index.document_frequency(word) for index in self.indexes)
+            if df == 0:
+                continue
+            idf = np.log1p((self.n_rows - df + 0.5) / (df + 0.5))
+            for index, span, local in parts:
+                tf = index.term_frequencies(word, local)
+                norm = self.k1 * (1 - self.b + self.b * index.lengths[local] / self.average)
+                total[span] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+
+def build_bm25_indexes(indexes):
+    """
+    Construye un Bm25Index por columna a partir de los textos ya normalizados de los
+    índices de trigramas.
+
+    Args:
+        indexes (dict): Nombre de columna -> TrigramIndex
+
+    Returns:
+        dict: Nombre de columna -> Bm25Index
+    """
+    return {col: Bm25Index(index.texts) for col, index in indexes.items()}
+
+
+def top_k(rows, scores, tiebreak, k=None):
+    """
+    Las `k` filas de mayor puntaje, de mayor a menor, desempatando por `tiebreak` (menor primero).
+
+    Con `k` menor que la cantidad de filas sólo se seleccionan las k mejores con una
+    selección parcial (`argpartition`) y se ordenan únicamente esas.
+
+    Args:
+        rows (numpy.ndarray): Posiciones de fila
+        scores (numpy.ndarray): Puntaje de cada fila de `rows`
+        tiebreak (numpy.ndarray): Rango de desempate de cada fila de `rows` (p. ej. por precio)
+        k (int): Cantidad de filas a devolver; None para todas
+
+    Returns:
+        numpy.ndarray: Posiciones de fila ordenadas por relevancia
+    """
+    rows = np.asarray(rows)
+    if k is not None and k < len(rows):
+        if k <= 0:
+            return rows[:0]
+        # Umbral: puntaje de la k-ésima fila; entre las empatadas en el umbral decide `tiebreak`
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)
+        needed = k - len(above)
+        if len(tied) > needed:
+            tied = tied[np.argpartition(tiebreak[tied], needed - 1)[:needed]]
+        chosen = np.concatenate([above, tied])
+        rows, scores, tiebreak = rows[chosen], scores[chosen], tiebreak[chosen]
+    order = np.lexsort((tiebreak, -scores))
+    return rows[order]
@@ -1,10 +1,6 @@
 import streamlit as st
-from logger import get_search_logs
+from logger import get_usage_cube
 import pandas as pd 
-import seaborn as sns
-from matplotlib import pyplot as plt 
-import numpy as np
-import plotly.express as px
 from datetime import datetime, timedelta
 
 
@@ -55,13 +51,17 @@ def inicio_semana(fecha):
     return fecha_inicio
 
 if "authenticated" in st.session_state and st.session_state["authenticated"] and st.session_state["username"] in st.secrets["admins"]:
+  # plotly sólo se carga al abrir el reporte (no en el arranque del buscador)
+  import plotly.express as px
+
   st.title("Datos de uso")
 
   # Primero debemos pullear los datos desde google sheets
   # Para esto usamos la función de logger.py
 
-  datos_uso = get_search_logs()
-  datos_uso = datos_uso[~datos_uso['username'].isin(st.secrets["admins"])]
+  # Agregado de búsquedas por usuario y hora; los gráficos se calculan sobre él
+  datos_uso = get_usage_cube()
+  admins = list(st.secrets["admins"])
   
   tipos_reporte = ['Búsquedas totales (todos los usuarios)', 'Búsquedas diarias por usuario']
 
@@ -126,7 +126,7 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
           subcols_left = st.columns([1, 1])
           with subcols_left[0]:
             # Seleccionar usuario
-            busqueda_usuario = st.selectbox("Selecciona un usuario:", sorted(list(datos_uso['username'].unique())))
+            busqueda_usuario = st.selectbox("Selecciona un usuario:", [u for u in datos_uso.users if u not in admins])
 
   # Funciones para generar los diferentes gráficos
 
@@ -137,20 +137,17 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
       
       mes_num = meses[mes]
       
-      # Filtrar datos por el mes y año seleccionados
-      datos['fecha'] = pd.to_datetime(datos['timestamp'])
-      filtrados = datos[
-          (datos['fecha'].dt.month == mes_num) & 
-          (datos['fecha'].dt.year == int(ano))
-      ]
+      # Periodo del mes y año seleccionados
+      inicio = datetime(int(ano), mes_num, 1)
+      fin = datetime(int(ano) + 1, 1, 1) if mes_num == 12 else datetime(int(ano), mes_num + 1, 1)
       
-      if filtrados.empty:
+      if datos.total(inicio, fin, exclude_users=admins) == 0:
           st.warning(f"No hay datos para {mes} de {ano}")
           return None
       
       if 'usuario' in tipo_reporte.lower() and 'todos' in tipo_reporte.lower():
           # Agrupar por usuario y contar las búsquedas
-          df_agrupado = filtrados.groupby('username').size().reset_index(name='búsquedas')
+          df_agrupado = datos.rollup(inicio, fin, 'username', exclude_users=admins)
           # Ordenar el dataframe de mayor a menor según la columna 'búsquedas'
           df_agrupado = df_agrupado.sort_values(by='búsquedas', ascending=False)
           fig = px.bar(
@@ -218,11 +215,9 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
 
 
       elif 'usuario' in tipo_reporte.lower() and 'todos' not in tipo_reporte.lower():
-          # Seleccionar el usuario "busqueda_usuario"
-          filtrados = filtrados[filtrados['username'] == busqueda_usuario]
-          # Agrupar por día y contar las búsquedas
-          filtrados['día'] = filtrados['fecha'].dt.day
-          df_agrupado = filtrados.groupby('día').size().reset_index(name='búsquedas')
+          # Seleccionar el usuario "busqueda_usuario" y agrupar por día
+          df_agrupado = datos.rollup(inicio, fin, 'day', username=busqueda_usuario)
+          df_agrupado['día'] = df_agrupado['day'].dt.day
           fig = px.bar(
               df_agrupado, 
               x='día', 
@@ -294,20 +289,16 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
       inicio = datetime.strptime(inicio_str, '%d/%m/%Y')
       fin = datetime.strptime(fin_str, '%d/%m/%Y')
       
-      # Filtrar datos por la semana seleccionada
-      datos['fecha'] = pd.to_datetime(datos['timestamp'])
-      filtrados = datos[
-          (datos['fecha'] >= inicio) & 
-          (datos['fecha'] <= fin)
-      ]
+      # La semana incluye el domingo completo
+      fin_excl = fin + timedelta(days=1)
       
-      if filtrados.empty:
+      if datos.total(inicio, fin_excl, exclude_users=admins) == 0:
           st.warning(f"No hay datos para la semana del {inicio_str} al {fin_str}")
           return None
       
       if 'usuario' in tipo_reporte.lower() and 'todos' in tipo_reporte.lower():
           # Agrupar por usuario y contar las búsquedas
-          df_agrupado = filtrados.groupby('username').size().reset_index(name='búsquedas')
+          df_agrupado = datos.rollup(inicio, fin_excl, 'username', exclude_users=admins)
           # Ordenar el dataframe de mayor a menor según la columna 'búsquedas'
           df_agrupado = df_agrupado.sort_values(by='búsquedas', ascending=False)
           fig = px.bar(
@@ -375,11 +366,9 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
           )
           
       elif 'usuario' in tipo_reporte.lower() and 'todos' not in tipo_reporte.lower():
-          # Seleccionar el usuario "busqueda_usuario"
-          filtrados = filtrados[filtrados['username'] == busqueda_usuario]
-          # Agrupar por día y contar las búsquedas
-          filtrados['día'] = filtrados['fecha'].dt.strftime('%d/%m')
-          df_agrupado = filtrados.groupby('día').size().reset_index(name='búsquedas')
+          # Seleccionar el usuario "busqueda_usuario" y agrupar por día
+          df_agrupado = datos.rollup(inicio, fin_excl, 'day', username=busqueda_usuario)
+          df_agrupado['día'] = df_agrupado['day'].dt.strftime('%d/%m')
           fig = px.bar(
               df_agrupado,
               x='día',
@@ -451,23 +440,16 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
           fecha = datetime.strptime(fecha, '%Y-%m-%d')
       
       fecha_inicio = datetime(fecha.year, fecha.month, fecha.day, 0, 0, 0)
-      fecha_fin = datetime(fecha.year, fecha.month, fecha.day, 23, 59, 59)
-      
-      # Filtrar datos por la fecha seleccionada
-      datos['fecha'] = pd.to_datetime(datos['timestamp'])
-      filtrados = datos[
-          (datos['fecha'] >= fecha_inicio) & 
-          (datos['fecha'] <= fecha_fin)
-      ]
+      fecha_fin = fecha_inicio + timedelta(days=1)
       
-      if filtrados.empty:
+      if datos.total(fecha_inicio, fecha_fin, exclude_users=admins) == 0:
           st.warning(f"No hay datos para el {fecha.strftime('%d/%m/%Y')}")
           return None
       
       if 'búsquedas' in tipo_reporte.lower():
           if 'usuario' in tipo_reporte.lower() and 'todos' in tipo_reporte.lower():
             # Agrupar por usuario y contar las búsquedas
-            df_agrupado = filtrados.groupby('username').size().reset_index(name='búsquedas')
+            df_agrupado = datos.rollup(fecha_inicio, fecha_fin, 'username', exclude_users=admins)
             # Ordenar el dataframe de mayor a menor según la columna 'búsquedas'
             df_agrupado = df_agrupado.sort_values(by='búsquedas', ascending=False)
             fig = px.bar(
@@ -532,13 +514,9 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
             )
             )
           elif 'usuario' in tipo_reporte.lower() and 'todos' not in tipo_reporte.lower():
-              # Seleccionar el usuario "busqueda_usuario"
-              filtrados = filtrados[filtrados['username'] == busqueda_usuario]
-              # Agrupar por usuario y contar las búsquedas
-              df_agrupado = filtrados.groupby('username').size().reset_index(name='búsquedas')
-              # Hacer desglose por hora del dia
-              filtrados['hora'] = filtrados['timestamp'].dt.hour
-              df_agrupado = filtrados.groupby(['username', 'hora']).size().reset_index(name='búsquedas')
+              # Seleccionar el usuario "busqueda_usuario" y hacer desglose por hora del dia
+              df_agrupado = datos.rollup(fecha_inicio, fecha_fin, 'hour', username=busqueda_usuario)
+              df_agrupado = df_agrupado.rename(columns={'hour': 'hora'})
               fig = px.bar(
                   df_agrupado, 
                   x='hora', 
@@ -615,30 +593,24 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
       # Calcular el número de días en el rango
       dias = (fecha_fin - fecha_inicio).days + 1
       
-      # Filtrar datos por el rango de fechas seleccionado
-      datos['fecha'] = pd.to_datetime(datos['timestamp'])
-      filtrados = datos[
-          (datos['fecha'] >= fecha_inicio) & 
-          (datos['fecha'] <= fecha_fin)
-      ]
+      # Periodo seleccionado, con el último día completo
+      fin_excl = fecha_fin.normalize() + timedelta(days=1)
       
       # Determinar el mejor agrupamiento según el rango de días
       if dias <= 31:  # Si es un mes o menos, agrupar por día
-          filtrados['grupo'] = filtrados['fecha'].dt.strftime('%d/%m')
+          group_by, formato = 'day', '%d/%m'
           label_x = 'Día'
-          group_by = 'grupo'
       else:  # Si es más de 6 meses, agrupar por mes
-          filtrados['grupo'] = filtrados['fecha'].dt.strftime('%b %Y')
+          group_by, formato = 'month', '%b %Y'
           label_x = 'Mes'
-          group_by = 'grupo'
           
-      if filtrados.empty:
+      if datos.total(fecha_inicio, fin_excl, exclude_users=admins) == 0:
           st.warning(f"No hay datos para el periodo del {fecha_inicio.strftime('%d/%m/%Y')} al {fecha_fin.strftime('%d/%m/%Y')}")
           return None
       
       if 'usuario' in tipo_reporte.lower() and 'todos' in tipo_reporte.lower():
           # Agrupar por usuario  y contar las búsquedas
-          df_agrupado = filtrados.groupby(['username']).size().reset_index(name='búsquedas')
+          df_agrupado = datos.rollup(fecha_inicio, fin_excl, 'username', exclude_users=admins)
           # Ordenar el dataframe de mayor a menor según la columna 'búsquedas'
           df_agrupado = df_agrupado.sort_values(by='búsquedas', ascending=False)
           fig = px.bar(
@@ -699,8 +671,8 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
           )
       elif 'usuario' in tipo_reporte.lower() and 'todos' not in tipo_reporte.lower():
           # Seleccionar el usuario "busqueda_usuario" y agrupar por dias o meses segun corresponda
-          filtrados = filtrados[filtrados['username'] == busqueda_usuario]
-          df_agrupado = filtrados.groupby([group_by]).size().reset_index(name='búsquedas')
+          df_agrupado = datos.rollup(fecha_inicio, fin_excl, group_by, username=busqueda_usuario)
+          df_agrupado['grupo'] = df_agrupado[group_by].dt.strftime(formato)
           fig = px.bar(
               df_agrupado, 
               x='grupo', 
@@ -782,9 +754,6 @@ if "authenticated" in st.session_state and st.session_state["authenticated"] and
       
       return None
 
-  # Obtener los datos
-  datos_uso = get_search_logs()
-  datos_uso = datos_uso[~datos_uso['username'].isin(st.secrets["admins"])]
   col_left, col_right = st.columns([1, 1])
   with col_left:
       subcols_left = st.columns([1, 1, 1])
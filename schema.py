@@ -0,0 +1,188 @@
+"""
+Tipos compactos del catálogo al cargarlo.
+
+`pd.read_csv` deja los precios como float64 y el texto como una cadena por fila. Al
+cargar el catálogo se aplica un esquema explícito:
+    - precios y "T. Entrega" como enteros (con nulos) del menor tamaño que cubre su rango,
+    - "Proveedor", "Stock" y "Comentario" como categorías (pocos valores distintos),
+    - las URL con su prefijo (hasta la última '/') guardado una sola vez por sitio.
+
+Uso (informe de memoria antes y después):
+    python schema.py data.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Columnas numéricas que se guardan como enteros si todos sus valores son enteros
+INTEGER_COLUMNS = ('Precio MSM', 'Precio Oferta', 'Precio Lista', 'T. Entrega')
+
+# Columnas de texto que se guardan como categoría si tienen pocos valores distintos
+CATEGORY_COLUMNS = ('Proveedor', 'Stock', 'Comentario')
+
+# Proporción máxima de valores distintos para convertir una columna en categoría
+MAX_CATEGORY_RATIO = 0.5
+
+_INTEGER_TYPES = ('Int8', 'Int16', 'Int32', 'Int64')
+
+
+def _compact_integers(series):
+    """
+    La columna como entero con nulos del menor tamaño posible; sin cambios si algún
+    valor no es numérico o tiene decimales (el texto se muestra tal cual en la grilla).
+    """
+    if isinstance(series.dtype, pd.api.types.CategoricalDtype):
+        return series
+    numbers = pd.to_numeric(series, errors='coerce')
+    if numbers.isna().sum() != series.isna().sum():
+        return series
+    values = numbers.dropna().to_numpy(dtype=float)
+    if len(values) and not np.array_equal(values, np.round(values)):
+        return series
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    for dtype in _INTEGER_TYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return numbers.astype(dtype)
+    return series
+
+
+def _compact_category(series, max_ratio=MAX_CATEGORY_RATIO):
+    """La columna como categoría si tiene pocos valores distintos."""
+    if isinstance(series.dtype, pd.api.types.CategoricalDtype) or len(series) == 0:
+        return series
+    if series.nunique() > max_ratio * len(series):
+        return series
+    return series.astype('category')
+
+
+def apply_schema(df):
+    """
+    Copia de `df` con los tipos compactos del catálogo (se puede aplicar más de una vez).
+
+    Args:
+        df (pandas.DataFrame): Catálogo tal como se leyó del CSV
+
+    Returns:
+        pandas.DataFrame: Mismas columnas y valores, con tipos más chicos
+    """
+    compact = {}
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            compact[col] = _compact_integers(df[col])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            compact[col] = _compact_category(df[col])
+    return df.assign(**compact)
+
+
+class PrefixedStrings:
+    """
+    Columna de texto (p. ej. URLs) guardada como prefijo compartido + resto.
+
+    El prefijo de cada valor (hasta la última '/', típicamente el sitio y la ruta del
+    proveedor) se guarda una sola vez y cada fila sólo lleva un código entero y el resto
+    del texto. Los valores completos se arman únicamente para las filas que se piden.
+    """
+
+    def __init__(self, values):
+        """
+        Args:
+            values: Valores de la columna, en el orden de las filas
+        """
+        series = pd.Series(values).astype(object)
+        self._missing = series.isna().to_numpy()
+        parts = series.where(~self._missing, '').astype(str).str.rpartition('/')
+        if len(series) == 0:
+            parts = pd.DataFrame({0: [], 1: [], 2: []}, dtype=str)
+        codes, prefixes = pd.factorize(parts[0] + parts[1])
+        self._codes = codes.astype(_code_dtype(len(prefixes)))
+        self._prefixes = np.asarray(prefixes, dtype=object)
+        self._suffixes = parts[2].array
+
+    def __len__(self):
+        return len(self._codes)
+
+    @classmethod
+    def concat(cls, columns):
+        """Une varias columnas en una, compartiendo los prefijos repetidos entre ellas."""
+        columns = list(columns)
+        joined = cls.__new__(cls)
+        codes, prefixes = pd.factorize(np.concatenate([c._prefixes for c in columns]) if columns else np.empty(0, dtype=object))
+        offsets = np.cumsum([0] + [len(c._prefixes) for c in columns])
+        joined._codes = np.concatenate(
+            [codes[offset + c._codes] for c, offset in zip(columns, offsets)] or [np.empty(0, dtype=np.int64)]
+        ).astype(_code_dtype(len(prefixes)))
+        joined._prefixes = np.asarray(prefixes, dtype=object)
+        joined._missing = np.concatenate([c._missing for c in columns] or [np.empty(0, dtype=bool)])
+        joined._suffixes = pd.concat([pd.Series(c._suffixes) for c in columns], ignore_index=True).array \
+            if columns else pd.array([], dtype=object)
+        return joined
+
+    def slice(self, start, end):
+        """Filas de `start` a `end` (comparte los arreglos, sin copiarlos)."""
+        part = self.__class__.__new__(self.__class__)
+        part._codes, part._missing = self._codes[start:end], self._missing[start:end]
+        part._prefixes, part._suffixes = self._prefixes, self._suffixes[start:end]
+        return part
+
+    def take(self, rows):
+        """Valores completos de las filas `rows` (None en los nulos)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        values = self._prefixes[self._codes[rows]] + self._suffixes.take(rows).to_numpy(dtype=object)
+        values[self._missing[rows]] = None
+        return values
+
+    @property
+    def nbytes(self):
+        """Memoria aproximada de la columna."""
+        return (self._codes.nbytes + self._missing.nbytes + self._suffixes.nbytes
+                + sum(len(p) for p in self._prefixes))
+
+
+def _code_dtype(n):
+    """Menor tipo entero con signo que representa códigos de 0 a n."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def memory_usage(df):
+    """Memoria (en bytes, contando el contenido del texto) de cada columna de `df`."""
+    return df.memory_usage(index=False, deep=True)
+
+
+def memory_report(before, after):
+    """
+    Comparación de la memoria de cada columna antes y después de aplicar el esquema.
+
+    Args:
+        before (pandas.DataFrame): Catálogo tal como se leyó del CSV
+        after (pandas.DataFrame): El mismo catálogo con apply_schema
+
+    Returns:
+        pandas.DataFrame: Tipo y MB antes y después por columna, con una fila 'Total'
+    """
+    report = pd.DataFrame({
+        'tipo antes': before.dtypes.astype(str),
+        'MB antes': memory_usage(before) / 1e6,
+        'tipo después': after.dtypes.astype(str),
+        'MB después': memory_usage(after) / 1e6,
+    })
+    report.loc['Total'] = ['', report['MB antes'].sum(), '', report['MB después'].sum()]
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv', help="CSV del catálogo")
+    args = parser.parse_args()
+    raw = pd.read_csv(args.csv, low_memory=False)
+    typed = apply_schema(raw)
+    report = memory_report(raw, typed)
+    if 'Url' in raw.columns:
+        urls = PrefixedStrings(raw['Url'])
+        report.loc['Url (prefijos compartidos)'] = ['', report.loc['Url', 'MB antes'], 'PrefixedStrings', urls.nbytes / 1e6]
+    print(report.round(2).to_string())
@@ -1,108 +1,360 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
 import numpy as np
 import pandas as pd
 
-def key_search(nsearch, options, df, considerar_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock):
-
-    if mostrar_stock == "No":
-      # First ensure the Stock column contains strings
-      df['Stock'] = df['Stock'].astype(str)
-      df = df[df['Stock'] != 0]
-      # Then filter out rows where Stock starts with '0'
-      df = df[~df['Stock'].str.strip().str.startswith('0')]
-        
-      df = df[~(df['Stock'].str.lower().str.contains('agotado'))]
-
-
-    search_bool = True
-
-    if seleccion_provs == "Excluir":
-        if buscar_en_prov != []:
-            df = df[~df['Proveedor'].isin(buscar_en_prov)]
-    elif seleccion_provs == "Incluir":
-        if buscar_en_prov != []:
-            df = df[df['Proveedor'].isin(buscar_en_prov)]
-            if options[f'search_{0}'].strip() == '':                  
-                if considerar_ofertas == "Sí":
-                    # Agregar una columna auxiliar con el menor valor entre A y B
-                    df['Min_Val'] = df[['Precio MSM', 'Precio Oferta']].min(axis=1)
-
-                    # Ordenar según la nueva columna
-                    df = df.sort_values(by=['Min_Val', 'Descripcion'], ascending=True)
-
-                    # Eliminar la columna auxiliar si no se necesita
-                    df = df.drop(columns=['Min_Val'])
-                else:
-                    df = df.sort_values(by=['Precio MSM', 'Descripcion'], ascending=True)
-
-                df = df[df['Precio MSM'] > 0]
-                df = df.drop(columns=['search_text'])
-                return df
-
-    if options[f'search_{0}'] == '':
-        return pd.DataFrame()
-    
-    df['search_text'] = df['search_text'].fillna('')
-    df['Descripcion'] = df['Descripcion'].fillna('')
-
-    if not considerar_descripcion:
-      if options[f'contains_{0}'] == 'Contiene':
-          search_bool = (df['search_text'].str.lower().str.contains(options[f'search_{0}'].lower()))
-      else:
-          search_bool = ~(df['search_text'].str.lower().str.contains(options[f'search_{0}'].lower()))
-    else:
-      if options[f'contains_{0}'] == 'Contiene':
-          search_bool = (df['Descripcion'].str.lower().str.contains(options[f'search_{0}'].lower()))
-      else:
-          search_bool = ~(df['Descripcion'].str.lower().str.contains(options[f'search_{0}'].lower()))
-
-    if not considerar_descripcion:
-      for i in range(1, nsearch):
-          if options[f'search_{i}'] != '':
-            if options[f'logical_{i}'] == 'Y':
-                if options[f'contains_{i}'] == 'Contiene':                
-                    search_bool = search_bool & (df['search_text'].str.lower().str.contains(options[f'search_{i}'].lower()))
-                else:
-                    search_bool = search_bool & (~(df['search_text'].str.lower().str.contains(options[f'search_{i}'].lower())))
-            elif options[f'logical_{i}'] == 'O':
-                if options[f'contains_{i}'] == 'Contiene':
-                    search_bool = search_bool | (df['search_text'].str.lower().str.contains(options[f'search_{i}'].lower()))
-                else:
-                    search_bool = search_bool | (~(df['search_text'].str.lower().str.contains(options[f'search_{i}'].lower())))
-          else:
-              break
-    else:
-        for i in range(1, nsearch):
-            if options[f'search_{i}'] != '':
-                if options[f'logical_{i}'] == 'Y':
-                    if options[f'contains_{i}'] == 'Contiene':
-                        search_bool = search_bool & (df['Descripcion'].str.lower().str.contains(options[f'search_{i}'].lower()))
-                    else:
-                        search_bool = search_bool & (~(df['Descripcion'].str.lower().str.contains(options[f'search_{i}'].lower())))
-                elif options[f'logical_{i}'] == 'O':
-                    if options[f'contains_{i}'] == 'Contiene':
-                        search_bool = search_bool | (df['Descripcion'].str.lower().str.contains(options[f'search_{i}'].lower()))
-                    else:
-                        search_bool = search_bool | (~(df['Descripcion'].str.lower().str.contains(options[f'search_{i}'].lower())))
-            else:
-                break
-
-                        
-
-    df = df[search_bool].drop(columns=['search_text'])
-
-    if considerar_ofertas == "Sí":
-        # Agregar una columna auxiliar con el menor valor entre A y B
-        df['Min_Val'] = df[['Precio MSM', 'Precio Oferta']].min(axis=1)
-
-        # Ordenar según la nueva columna
-        df = df.sort_values(by=['Min_Val', 'Descripcion'], ascending=True)
-
-        # Eliminar la columna auxiliar si no se necesita
-        df = df.drop(columns=['Min_Val'])
+from query import from_boxes, implies, parse_query, positive_terms, run
+from relevance import tokenize
+from text_index import intersect_sorted
+
+# Memoria máxima que pueden ocupar los resultados guardados en la caché compartida
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Versiones reemplazadas que se recuerdan para que una búsqueda atrasada no use la caché
+RETIRED_VERSIONS_MAX = 16
+
+
+class QueryCache:
+    """
+    Caché LRU de resultados de búsqueda compartida por todas las sesiones del proceso.
+
+    Las entradas se indexan por la consulta normalizada y se acotan por memoria. Al
+    cambiar la versión del catálogo se descartan todas; las búsquedas que aún corren
+    con una versión reemplazada no leen ni escriben la caché. Los DataFrames guardados
+    se comparten entre sesiones, por lo que no deben modificarse.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        # Últimas versiones reemplazadas (sólo las claves; las más viejas se olvidan)
+        self._retired = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _reset_version(self, version):
+        """
+        Pasa a `version` si es nueva. Devuelve False si es una versión ya reemplazada (una
+        búsqueda que empezó antes de actualizar el catálogo), que no usa la caché.
+        """
+        if version == self._version:
+            return True
+        if version in self._retired:
+            return False
+        if self._version is not None:
+            self._retired[self._version] = None
+            if len(self._retired) > RETIRED_VERSIONS_MAX:
+                self._retired.popitem(last=False)
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+        return True
+
+    def get(self, key, version):
+        """Devuelve el resultado guardado para `key`, o None si no está."""
+        with self._lock:
+            if not self._reset_version(version):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, version, result):
+        """Guarda un resultado, descartando los menos usados si se supera la memoria máxima."""
+        size = _nbytes(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._reset_version(version):
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Contadores de la caché para mostrar a los administradores."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'version': self._version,
+            }
+
+
+def _nbytes(value):
+    """Memoria aproximada de un resultado guardado (DataFrame, arreglo o tupla de ellos)."""
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return 0
+
+
+result_cache = QueryCache()
+
+
+class ProviderCounts(Mapping):
+    """
+    Coincidencias de una búsqueda por proveedor, para rotular la lista de proveedores.
+
+    Con "Incluir" la búsqueda sólo recorre los proveedores elegidos; las coincidencias de
+    los demás se calculan la primera vez que se piden (`pending`), evaluando la consulta
+    sólo sobre sus filas, y se guardan. Se comparte entre sesiones junto con el resultado.
+    """
+
+    def __init__(self, counts, pending=None):
+        """
+        Args:
+            counts (dict): Proveedor -> coincidencias ya contadas
+            pending (callable): pending() -> dict con las de los demás proveedores, o None
+        """
+        self._counts = counts
+        self._pending = pending
+        self._lock = threading.Lock()
+
+    def _complete(self):
+        with self._lock:
+            if self._pending is not None:
+                self._counts = {**self._pending(), **self._counts}
+                self._pending = None
+            return self._counts
+
+    def __getitem__(self, provider):
+        if provider not in self._counts and self._pending is not None:
+            return self._complete()[provider]
+        return self._counts[provider]
+
+    def __iter__(self):
+        return iter(self._complete())
+
+    def __len__(self):
+        return len(self._complete())
+
+    def __deepcopy__(self, memo):
+        # pandas copia los attrs en cada operación derivada; los conteos no se modifican
+        return self
+
+
+class SearchSession:
+    """
+    Última búsqueda de una sesión, para evaluar sus refinamientos sólo sobre las filas
+    que ya coincidían.
+
+    Si la nueva búsqueda sólo puede angostar la anterior (un término más largo, una caja Y
+    más, un filtro de proveedor o de stock más estricto), se evalúa sobre las filas que
+    coincidieron con la anterior en lugar de sobre todo el catálogo.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.expression = None
+        self.filters = None
+        self.rows = None
+        self.refinements = 0
+
+    def remember(self, version, expression, filters, rows):
+        """Guarda la búsqueda recién evaluada y sus filas coincidentes (ordenadas)."""
+        self.version, self.expression, self.filters, self.rows = version, expression, filters, rows
+
+    def previous_rows(self, version, expression, filters):
+        """
+        Filas de la búsqueda anterior si la nueva es un refinamiento de ella; si no, None.
+        """
+        if self.rows is None or version != self.version or expression is None:
+            return None
+        if not (_narrower_filters(filters, self.filters) and implies(expression, self.expression)):
+            return None
+        self.refinements += 1
+        return self.rows
+
+
+def _filters(considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock):
+    """Filtros de una búsqueda en forma comparable: (columna, sólo con stock, incluidos, excluidos)."""
+    include = frozenset(buscar_en_prov) if seleccion_provs == "Incluir" and buscar_en_prov else None
+    exclude = frozenset(buscar_en_prov) if seleccion_provs == "Excluir" else frozenset()
+    return (bool(considerar_descripcion), mostrar_stock == "No", include, exclude)
+
+
+def _narrower_filters(new, old):
+    """Indica si los filtros `new` dejan pasar un subconjunto de las filas que deja `old`."""
+    column, in_stock, include, exclude = new
+    old_column, old_in_stock, old_include, old_exclude = old
+    return (
+        column == old_column
+        and (in_stock or not old_in_stock)
+        and (old_include is None or (include is not None and include <= old_include))
+        and exclude >= old_exclude
+    )
+
+
+# Ordenamientos ofrecidos en la interfaz y su permutación en el catálogo
+SORT_OPTIONS = {"Precio": 'precio', "T. Entrega": 'entrega', "Stock": 'stock', "Relevancia": 'relevancia'}
+
+# Ordenamiento por relevancia: puntaje BM25 de los términos buscados, con el precio como desempate
+RELEVANCE = 'relevancia'
+
+# Filas que se seleccionan al ordenar por relevancia (10 páginas de resultados)
+RELEVANCE_LIMIT = 500
+
+
+def _ordering(considerar_ofertas, orden):
+    """Nombre del ordenamiento del catálogo que corresponde a las opciones elegidas."""
+    ordering = SORT_OPTIONS.get(orden, 'precio')
+    if ordering == 'precio' and considerar_ofertas == "Sí":
+        # Ordenar por el menor valor entre precio y oferta
+        return 'oferta'
+    return ordering
+
+
+def _price_ordering(considerar_ofertas):
+    """Ordenamiento por precio (o por el menor entre precio y oferta)."""
+    return _ordering(considerar_ofertas, "Precio")
+
+
+def key_search(nsearch, options, catalog, considerar_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock, query=None, orden="Precio", limit=None, session=None):
+    """
+    Busca productos en el catálogo.
+
+    Los resultados se guardan en una caché compartida por todas las sesiones.
+    Las cajas de búsqueda (o la búsqueda avanzada, si se indica) se compilan en un árbol
+    de consulta; el planificador evalúa primero los términos más selectivos y cada término
+    siguiente sólo sobre las filas que sobreviven. Los filtros de stock, precio y
+    proveedores se combinan con los bitmaps precalculados del catálogo, sólo en los rangos
+    de filas de los proveedores elegidos, y sólo se materializan las filas del resultado. Si la búsqueda refina la
+    anterior de la sesión, se evalúa sólo sobre las filas de aquélla.
+
+    Args:
+        nsearch (int): Número de cajas de búsqueda
+        options (dict): Estado con search_i, logical_i y contains_i de cada caja
+        catalog (Catalog): Catálogo de productos
+        considerar_ofertas (str): "Sí" para ordenar por el menor entre precio y oferta
+        considerar_descripcion (bool): Buscar sólo en "Descripcion" en lugar de "search_text"
+        buscar_en_prov (list): Proveedores a incluir o excluir
+        seleccion_provs (str): "Incluir" o "Excluir"
+        mostrar_stock (str): "No" para ocultar los productos sin stock
+        query (str): Búsqueda avanzada con Y/O/NO y paréntesis; reemplaza a las cajas
+        orden (str): "Precio", "T. Entrega", "Stock" o "Relevancia"
+        limit (int): Con "Relevancia", cantidad máxima de filas a devolver; sólo se
+            seleccionan (sin ordenar el resto) las `limit` más relevantes
+        session (SearchSession): Última búsqueda de la sesión, para reutilizarla al refinar
+
+    Returns:
+        pandas.DataFrame: Productos encontrados, en el orden elegido (compartido; no modificar).
+            `attrs['total']` trae la cantidad de coincidencias aunque se haya aplicado `limit`,
+            `attrs['provider_counts']` cuántas hay de cada proveedor y `attrs['version']` la
+            versión del catálogo con la que se calculó
+
+    Raises:
+        QuerySyntaxError: Si la búsqueda avanzada está mal formada
+    """
+    expression = parse_query(query) if query and query.strip() else from_boxes(nsearch, options)
+
+    # Consulta normalizada: dos búsquedas equivalentes comparten la entrada de la caché
+    providers = tuple(sorted(buscar_en_prov)) if seleccion_provs in ("Incluir", "Excluir") else ()
+    cache_key = (repr(expression), considerar_ofertas, bool(considerar_descripcion),
+                 seleccion_provs if providers else '', providers, mostrar_stock, _ordering(considerar_ofertas, orden),
+                 limit if _ordering(considerar_ofertas, orden) == RELEVANCE else None)
+    filters = _filters(considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock)
+    cached = result_cache.get(cache_key, catalog.version)
+    if cached is None:
+        previous = session.previous_rows(catalog.version, expression, filters) if session is not None else None
+        cached = _key_search(expression, catalog, considerar_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock, orden, limit, previous)
+        result_cache.put(cache_key, catalog.version, cached)
+    result, rows = cached
+    if session is not None and rows is not None:
+        session.remember(catalog.version, expression, filters, rows)
+    return result
+
+
+def _key_search(expression, catalog, considerar_ofertas, considerar_descripcion, buscar_en_prov, seleccion_provs, mostrar_stock, orden="Precio", limit=None, previous=None):
+    """
+    Evalúa una búsqueda ya compilada sobre el catálogo (sin pasar por la caché).
+
+    Args:
+        previous (numpy.ndarray): Filas de una búsqueda que ésta refina; si se indica, sólo
+            se evalúan ésas
+
+    Returns:
+        tuple: (DataFrame del resultado, posiciones ordenadas de todas las coincidencias,
+        o None si no hubo términos de búsqueda)
+    """
+    ordering = _ordering(considerar_ofertas, orden)
+    if ordering == RELEVANCE and expression is None:
+        # Sin términos no hay puntaje: se ordena por precio
+        ordering = _price_ordering(considerar_ofertas)
+    include = seleccion_provs == "Incluir" and buscar_en_prov != []
+    in_stock = mostrar_stock == "No"
+    if expression is None and not include:
+        return _stamp(pd.DataFrame(), catalog), None
+
+    if expression is None:
+        # Sólo los proveedores elegidos, recorriendo únicamente sus rangos de filas
+        rows = catalog.filtered_rows(buscar_en_prov, in_stock=in_stock)
+        return _result(catalog, catalog.ordered(rows, ordering), counts=catalog.provider_counts(in_stock=in_stock)), None
+
+    # Filtros de stock, precio y proveedores: AND de los bitmaps precalculados, sólo en los
+    # rangos de los proveedores incluidos (o de todos menos los excluidos)
+    if include:
+        rows = catalog.filtered_rows(buscar_en_prov, in_stock=in_stock)
     else:
-        df = df.sort_values(by=['Precio MSM', 'Descripcion'], ascending=True)
+        excluded = buscar_en_prov if seleccion_provs == "Excluir" and buscar_en_prov != [] else None
+        rows = catalog.filtered_rows(excluded, exclude=True, in_stock=in_stock)
+    column = 'Descripcion' if considerar_descripcion else 'search_text'
+    if previous is not None:
+        rows = intersect_sorted(previous, rows)
+    rows = run(expression, catalog, column, rows)
+    counts = catalog.provider_counts(rows)
+    if include:
+        # Las coincidencias de los proveedores no elegidos se cuentan aparte, sólo si se piden
+        def others():
+            return catalog.provider_counts(run(expression, catalog, column, catalog.filtered_rows(buscar_en_prov, exclude=True, in_stock=in_stock)))
+        selected = set(buscar_en_prov)
+        counts = ProviderCounts({p: n for p, n in counts.items() if p in selected}, others)
+    if ordering == RELEVANCE:
+        words = [w for text in positive_terms(expression) for w in tokenize(text)]
+        columns = (column,) if considerar_descripcion else tuple(catalog.relevance)
+        ranked = catalog.ranked(rows, words, columns, _price_ordering(considerar_ofertas), limit)
+        return _result(catalog, ranked, total=len(rows), counts=counts), rows
+    return _result(catalog, catalog.ordered(rows, ordering), counts=counts), rows
+
 
-    df = df[df['Precio MSM'] > 0]
-    return df
+def _result(catalog, rows, total=None, counts=None):
+    """
+    Materializa las filas del resultado y anota el total de coincidencias y, si se
+    indica, cuántas hay de cada proveedor (`counts`).
+    """
+    result = _stamp(catalog.take(rows), catalog)
+    result.attrs['total'] = len(rows) if total is None else total
+    if counts is not None:
+        result.attrs['provider_counts'] = counts
+    return result
 
 
+def _stamp(result, catalog):
+    """Anota en el resultado la versión del catálogo con la que se calculó."""
+    result.attrs['version'] = catalog.version
+    return result
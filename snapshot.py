@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+from schema import apply_schema, memory_usage
+
+logger = logging.getLogger(__name__)
+
+# Carpeta local donde se guardan las versiones del catálogo en formato columnar
+SNAPSHOT_DIR = Path('.catalog_cache')
+MANIFEST_NAME = 'manifest.json'
+# Versiones anteriores que se conservan por si otro proceso las está leyendo
+KEEP_SNAPSHOTS = 2
+
+
+def _atomic_write_bytes(path, data):
+    """
+    Escribe `data` en `path` mediante un archivo temporal en la misma carpeta y `os.replace`,
+    de modo que ningún proceso lea nunca un archivo a medio escribir.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}-', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 del contenido de un archivo."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(Path(cache_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not (Path(cache_dir) / manifest.get('snapshot', '')).is_file():
+        return None
+    return manifest
+
+
+def _write_manifest(cache_dir, manifest):
+    _atomic_write_bytes(Path(cache_dir) / MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'))
+
+
+def remote_fingerprint(url, timeout=5):
+    """
+    Huella barata del archivo remoto a partir de las cabeceras HTTP (sin descargarlo).
+
+    Returns:
+        str | None: ETag o Last-Modified + Content-Length, o None si el servidor no los entrega
+        (por ejemplo, cuando Drive responde con una página HTML intermedia)
+    """
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"No se pudo verificar la versión remota del catálogo: {str(e)}")
+        return None
+    headers = response.headers
+    if 'text/html' in headers.get('Content-Type', ''):
+        return None
+    if headers.get('ETag'):
+        return f"etag:{headers['ETag']}"
+    if headers.get('Last-Modified'):
+        return f"modified:{headers['Last-Modified']}:{headers.get('Content-Length', '')}"
+    return None
+
+
+def _read_snapshot(cache_dir, manifest):
+    # Las copias guardadas antes del esquema compacto se convierten al leerlas
+    return apply_schema(pd.read_feather(Path(cache_dir) / manifest['snapshot']))
+
+
+def _write_snapshot(cache_dir, df, version):
+    """Guarda el catálogo como Feather (Arrow) de forma atómica y devuelve el nombre del archivo."""
+    name = f'catalog-{version}.feather'
+    fd, tmp = tempfile.mkstemp(prefix=f'.{name}-', dir=cache_dir)
+    os.close(fd)
+    try:
+        df.to_feather(tmp)
+        os.replace(tmp, Path(cache_dir) / name)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return name
+
+
+def _prune_snapshots(cache_dir, current):
+    """Elimina las versiones antiguas, conservando las KEEP_SNAPSHOTS más recientes."""
+    snapshots = sorted(Path(cache_dir).glob('catalog-*.feather'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in snapshots[KEEP_SNAPSHOTS:]:
+        if old.name != current:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def _snapshot_unless(cache_dir, manifest, known_version):
+    """Lee la versión local, salvo que sea la que ya tiene cargada quien llama (devuelve None)."""
+    if known_version is not None and manifest['version'] == known_version:
+        return None
+    return _read_snapshot(cache_dir, manifest)
+
+
+def load_catalog(url, csv_path='data.csv', cache_dir=SNAPSHOT_DIR, max_age=300, known_version=None):
+    """
+    Carga el catálogo desde la última versión local si sigue vigente; si no, lo descarga de Google Drive.
+
+    La vigencia se decide así:
+      1. Si la versión local se verificó hace menos de `max_age` segundos, se usa sin más.
+      2. Si las cabeceras HTTP del archivo remoto coinciden con las de la versión local, se usa sin descargar.
+      3. Si no, se descarga el CSV; si su checksum coincide con el de la versión local, se evita volver a parsearlo.
+    Si Drive no responde se sigue sirviendo la última versión local válida.
+
+    Args:
+        url (str): Enlace de Google Drive del CSV
+        csv_path (str): Ruta donde se deja una copia del CSV descargado
+        cache_dir (Path): Carpeta de las versiones locales
+        max_age (int): Segundos durante los que una versión local se considera vigente sin verificar
+        known_version (str): Versión que ya tiene cargada quien llama; si es la vigente no se
+            vuelve a leer y se devuelve None en lugar del DataFrame
+
+    Returns:
+        tuple: (DataFrame del catálogo, versión) donde la versión es un prefijo del checksum del CSV
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(cache_dir)
+
+    if manifest is not None:
+        if time.time() - manifest.get('checked_at', 0) < max_age:
+            logger.info(f"Catálogo {manifest['version']} cargado desde la copia local")
+            return _snapshot_unless(cache_dir, manifest, known_version), manifest['version']
+
+        fingerprint = remote_fingerprint(url)
+        if fingerprint is not None and fingerprint == manifest.get('fingerprint'):
+            manifest['checked_at'] = time.time()
+            _write_manifest(cache_dir, manifest)
+            logger.info(f"Catálogo {manifest['version']} sin cambios en Drive")
+            return _snapshot_unless(cache_dir, manifest, known_version), manifest['version']
+    else:
+        fingerprint = remote_fingerprint(url)
+
+    # Descargar a un archivo temporal propio de este proceso
+    csv_path = Path(csv_path)
+    fd, tmp_csv = tempfile.mkstemp(prefix=f'.{csv_path.name}-', suffix='.tmp', dir=csv_path.parent)
+    os.close(fd)
+    try:
+        # gdown sólo se carga cuando hay que descargar
+        import gdown
+
+        downloaded = gdown.download(url, tmp_csv, quiet=False)
+        if downloaded is None:
+            raise RuntimeError("gdown no pudo descargar el catálogo")
+    except Exception as e:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+        if manifest is None:
+            raise
+        logger.warning(f"Drive no disponible ({str(e)}); se usa el catálogo local {manifest['version']}")
+        return _snapshot_unless(cache_dir, manifest, known_version), manifest['version']
+
+    try:
+        checksum = _file_checksum(tmp_csv)
+        version = checksum[:16]
+
+        if manifest is not None and manifest.get('checksum') == checksum:
+            df = _snapshot_unless(cache_dir, manifest, known_version)
+            snapshot_name = manifest['snapshot']
+        else:
+            # low_memory=False para que cada columna tenga un único tipo y se pueda guardar en Arrow
+            raw = pd.read_csv(tmp_csv, low_memory=False)
+            df = apply_schema(raw)
+            before, after = memory_usage(raw).sum() / 1e6, memory_usage(df).sum() / 1e6
+            logger.info(f"Memoria del catálogo: {before:.1f} MB -> {after:.1f} MB con el esquema compacto")
+            del raw
+            try:
+                snapshot_name = _write_snapshot(cache_dir, df, version)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar la copia local del catálogo: {str(e)}")
+                snapshot_name = None
+
+        os.replace(tmp_csv, csv_path)
+    finally:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+
+    if snapshot_name is not None:
+        _write_manifest(cache_dir, {
+            'version': version,
+            'checksum': checksum,
+            'fingerprint': fingerprint,
+            'snapshot': snapshot_name,
+            'checked_at': time.time(),
+        })
+        _prune_snapshots(cache_dir, snapshot_name)
+
+    if df is None:
+        logger.info(f"Catálogo {version} descargado de Drive, sin cambios")
+    else:
+        logger.info(f"Catálogo {version} descargado de Drive ({len(df)} filas)")
+    return df, version
@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from catalog import Catalog, CatalogShard
+from facets import FacetIndex
+from relevance import Bm25Index, ShardedBm25
+from schema import PrefixedStrings
+from snapshot import KEEP_SNAPSHOTS, SNAPSHOT_DIR
+from text_index import ShardedTextIndex, SkuIndex, TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# Carpeta con los catálogos ya armados (columnas normalizadas e índices), uno por versión
+STORE_DIR = SNAPSHOT_DIR / 'catalogs'
+MANIFEST_NAME = 'manifest.json'
+# Versión del formato en disco; las carpetas de otro formato se ignoran y se rearman
+STORE_FORMAT = 3
+
+# Arreglos de cada estructura que se guardan en disco (el resto se deriva al abrir)
+TRIGRAM_ARRAYS = ('codes', 'offsets', '_keys', '_starts', '_rows')
+BM25_ARRAYS = ('vocabulary', '_rows', '_tf', '_starts', 'doc_freq', '_previous', 'lengths')
+CATALOG_ARRAYS = ('_source_rows', '_positions', 'in_stock', 'price', 'offer', 'delivery', 'effective_price',
+                  'price_valid', 'has_offer', 'stock_value', 'stock_state', 'name_missing')
+# Arreglos por fila de cada fragmento, que al abrir son tramos de los del catálogo
+SHARD_ARRAYS = ('price', 'offer', 'delivery', 'stock_value', 'stock_state', 'name_missing')
+
+
+def _save_array(directory, name, value):
+    """Guarda un arreglo como .npy; el texto como Unicode de largo fijo (legible con mmap)."""
+    value = np.asarray(value)
+    if value.dtype == object:
+        value = value.astype(str) if len(value) else np.empty(0, dtype='<U1')
+    np.save(Path(directory) / f'{name}.npy', value, allow_pickle=False)
+
+
+def _open_array(directory, name):
+    """Abre un .npy con mmap, de solo lectura y sin copiarlo."""
+    return np.load(Path(directory) / f'{name}.npy', mmap_mode='r', allow_pickle=False)
+
+
+def _write_table(path, columns):
+    """Guarda columnas de igual largo como Feather sin comprimir (un solo bloque), legible con mmap."""
+    table = pa.table(columns) if columns else pa.table({'_': pa.array([], pa.int8())})
+    feather.write_feather(table, path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+
+
+def _write_frame(path, df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Texto como large_string, el tipo que usa pandas: al abrirlo no hay que convertirlo (copiarlo)
+    table = table.cast(pa.schema([field.with_type(pa.large_string()) if field.type == pa.string() else field
+                                  for field in table.schema], metadata=table.schema.metadata))
+    feather.write_feather(table, path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+
+
+def _read_table(path):
+    return feather.read_table(path, memory_map=True)
+
+
+def _arrow_string_dtype():
+    """
+    Tipo de pandas para texto respaldado por Arrow con nulos NaN: el `str` de pandas 3 o,
+    en versiones anteriores, el más parecido que haya.
+    """
+    for args in ({'storage': 'pyarrow', 'na_value': np.nan}, {'storage': 'pyarrow_numpy'}, {'storage': 'pyarrow'}):
+        try:
+            return pd.StringDtype(**args)
+        except (TypeError, ValueError):
+            continue
+
+
+def _to_pandas(table):
+    """
+    DataFrame de una tabla abierta con mmap. El texto queda como arreglo de Arrow sobre
+    el mismo buffer (sin copiarse a objetos de Python, también con pandas < 3) y cada
+    columna en su propio bloque.
+    """
+    dtype = _arrow_string_dtype()
+    return table.to_pandas(split_blocks=True, types_mapper=lambda t: dtype if t in (pa.string(), pa.large_string()) else None)
+
+
+def _read_manifest(directory):
+    """Manifiesto del catálogo guardado en `directory`, o None si no hay uno publicado."""
+    try:
+        with open(Path(directory) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_catalog(catalog, directory):
+    """
+    Escribe en `directory` todo lo necesario para abrir `catalog` sin rearmarlo: las
+    columnas (ya normalizadas y formateadas) en Feather sin comprimir y cada índice como
+    arreglos .npy.
+
+    Args:
+        catalog (Catalog): Catálogo armado
+        directory (Path): Carpeta de destino (debe existir y estar vacía)
+    """
+    directory = Path(directory)
+    shards = [catalog._shards[name] for name in catalog._order]
+    text_columns = list(shards[0].indexes)
+
+    _write_frame(directory / 'frame.feather', catalog._df.reset_index(drop=True))
+    _write_frame(directory / 'display.feather', catalog._display.reset_index(drop=True))
+    # Textos en minúsculas de los índices y restos de las URL, una columna por campo
+    strings = {f'texto:{col}': pa.array(np.concatenate([s.indexes[col].texts for s in shards]).tolist(), pa.large_string())
+               for col in text_columns}
+    for col, prefixed in catalog._prefixed.items():
+        strings[f'resto:{col}'] = pa.array(prefixed._suffixes.tolist(), pa.large_string())
+    _write_table(directory / 'strings.feather', strings)
+
+    arrays = directory / 'arrays'
+    arrays.mkdir()
+    for name in CATALOG_ARRAYS:
+        _save_array(arrays, name, getattr(catalog, name))
+    for name, (perm, rank) in catalog._orderings.items():
+        _save_array(arrays, f'orden.{name}.perm', perm)
+        _save_array(arrays, f'orden.{name}.rank', rank)
+    _save_array(arrays, 'sku.codes', catalog.sku_index.codes)
+    _save_array(arrays, 'sku.sorted_codes', catalog.sku_index._sorted_codes)
+    _save_array(arrays, 'sku.sorted_rows', catalog.sku_index._sorted_rows)
+    for col, prefixed in catalog._prefixed.items():
+        _save_array(arrays, f'prefijo.{col}.codes', prefixed._codes)
+        _save_array(arrays, f'prefijo.{col}.missing', prefixed._missing)
+
+    bm25 = []
+    for i, shard in enumerate(shards):
+        for col in text_columns:
+            for attr in TRIGRAM_ARRAYS:
+                _save_array(arrays, f'f{i}.trigramas.{col}.{attr.strip("_")}', getattr(shard.indexes[col], attr))
+            index = shard.relevance[col]
+            for attr in BM25_ARRAYS:
+                _save_array(arrays, f'f{i}.bm25.{col}.{attr.strip("_")}', getattr(index, attr))
+        bm25.append({col: [shard.relevance[col].k1, shard.relevance[col].b] for col in text_columns})
+
+    manifest = {
+        'format': STORE_FORMAT,
+        'version': catalog.version,
+        'source': catalog.source,
+        'columns': list(catalog.columns),
+        'text_columns': text_columns,
+        'prefixed': {col: prefixed._prefixes.tolist() for col, prefixed in catalog._prefixed.items()},
+        'shards': [{'provider': shard.provider, 'fingerprint': shard.fingerprint,
+                    'range': list(catalog._ranges[shard.provider]), 'bm25': params}
+                   for shard, params in zip(shards, bm25)],
+    }
+    with open(directory / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def open_catalog(directory):
+    """
+    Abre un catálogo guardado con `save_catalog` sin reconstruir nada.
+
+    Las columnas de texto y los arreglos de los índices quedan respaldados por los
+    archivos vía mmap (lectura sin copia): varios procesos que abren la misma versión
+    comparten una única copia física en la caché de páginas del sistema operativo.
+
+    Args:
+        directory (Path): Carpeta escrita por `save_catalog`
+
+    Returns:
+        Catalog: Catálogo de solo lectura, equivalente al que se guardó
+    """
+    directory = Path(directory)
+    with open(directory / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != STORE_FORMAT:
+        raise ValueError(f"Formato {manifest.get('format')} no soportado")
+    arrays = directory / 'arrays'
+
+    catalog = Catalog.__new__(Catalog)
+    catalog.version = manifest['version']
+    catalog.source = manifest.get('source', catalog.version)
+    catalog._columns = pd.Index(manifest['columns'])
+    for name in CATALOG_ARRAYS:
+        setattr(catalog, name, _open_array(arrays, name))
+    labels = pd.Index(np.asarray(catalog._source_rows))
+    catalog._df = _to_pandas(_read_table(directory / 'frame.feather'))
+    catalog._display = _to_pandas(_read_table(directory / 'display.feather'))
+    # Se asigna el índice en lugar de usar set_axis/reset_index, que con pandas < 3 copian las columnas
+    catalog._df.index = catalog._display.index = labels
+    strings = _read_table(directory / 'strings.feather')
+
+    catalog._orderings = {}
+    for name in ('precio', 'oferta', 'entrega', 'stock'):
+        catalog._orderings[name] = (_open_array(arrays, f'orden.{name}.perm'), _open_array(arrays, f'orden.{name}.rank'))
+
+    sku = SkuIndex.__new__(SkuIndex)
+    sku.codes = _open_array(arrays, 'sku.codes')
+    sku._sorted_codes = _open_array(arrays, 'sku.sorted_codes')
+    sku._sorted_rows = _open_array(arrays, 'sku.sorted_rows')
+    catalog.sku_index = sku
+
+    catalog._prefixed = {}
+    for col, prefixes in manifest['prefixed'].items():
+        prefixed = PrefixedStrings.__new__(PrefixedStrings)
+        prefixed._codes = _open_array(arrays, f'prefijo.{col}.codes')
+        prefixed._missing = _open_array(arrays, f'prefijo.{col}.missing')
+        prefixed._prefixes = np.asarray(prefixes, dtype=object)
+        prefixed._suffixes = pd.arrays.ArrowStringArray(strings.column(f'resto:{col}'))
+        catalog._prefixed[col] = prefixed
+
+    text_columns = manifest['text_columns']
+    texts = {col: pd.arrays.ArrowStringArray(strings.column(f'texto:{col}')) for col in text_columns}
+    shards = []
+    for i, entry in enumerate(manifest['shards']):
+        start, end = entry['range']
+        shard = CatalogShard.__new__(CatalogShard)
+        shard.provider = entry['provider']
+        shard.fingerprint = entry['fingerprint']
+        shard.columns = catalog._columns
+        shard.prefixed = {col: prefixed.slice(start, end) for col, prefixed in catalog._prefixed.items()}
+        shard.df, shard.display = catalog._df.iloc[start:end], catalog._display.iloc[start:end]
+        shard.df.index = shard.display.index = pd.RangeIndex(end - start)
+        shard.sku_codes = catalog.sku_index.codes[start:end]
+        for name in SHARD_ARRAYS:
+            setattr(shard, name, getattr(catalog, name)[start:end])
+        shard.indexes, shard.relevance = {}, {}
+        for col in text_columns:
+            index = TrigramIndex.__new__(TrigramIndex)
+            index.texts = texts[col][start:end]
+            index.n_rows = end - start
+            for attr in TRIGRAM_ARRAYS:
+                setattr(index, attr, _open_array(arrays, f'f{i}.trigramas.{col}.{attr.strip("_")}'))
+            shard.indexes[col] = index
+            bm25 = Bm25Index.__new__(Bm25Index)
+            bm25.k1, bm25.b = entry['bm25'][col]
+            bm25.n_rows = end - start
+            for attr in BM25_ARRAYS:
+                setattr(bm25, attr, _open_array(arrays, f'f{i}.bm25.{col}.{attr.strip("_")}'))
+            shard.relevance[col] = bm25
+        shards.append(shard)
+
+    catalog._shards = {shard.provider: shard for shard in shards}
+    catalog._order = [shard.provider for shard in shards]
+    catalog._ranges = {entry['provider']: tuple(entry['range']) for entry in manifest['shards']}
+    catalog.providers = sorted(p for p in catalog._order if p is not None)
+    # Los bitmaps de los filtros ocupan un bit por fila: se arman al abrir
+    catalog.facets = FacetIndex(len(catalog._source_rows), catalog._ranges, catalog.stock_state,
+                                catalog.has_offer, catalog.price_valid)
+    offsets = np.array([entry['range'][0] for entry in manifest['shards']], dtype=np.int64)
+    catalog.indexes = {col: ShardedTextIndex([s.indexes[col] for s in shards], offsets) for col in text_columns}
+    catalog.relevance = {col: ShardedBm25([s.relevance[col] for s in shards], offsets) for col in text_columns}
+    return catalog
+
+
+class CatalogStore:
+    """
+    Catálogos ya armados guardados en disco, uno por versión, para que cada proceso de
+    Streamlit los abra con mmap en lugar de normalizar e indexar su propia copia.
+
+    Cada versión se escribe en una carpeta temporal y se publica con un rename atómico;
+    si otro proceso la publicó antes, se descarta la propia.
+    """
+
+    def __init__(self, directory=STORE_DIR, keep=KEEP_SNAPSHOTS):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    def path(self, version):
+        return self.directory / f'catalog-{version}'
+
+    def open(self, version):
+        """Catálogo guardado de `version`, o None si no está (o no se puede abrir)."""
+        path = self.path(version)
+        if not (path / MANIFEST_NAME).is_file():
+            return None
+        try:
+            return open_catalog(path)
+        except Exception as e:
+            logger.warning(f"No se pudo abrir el catálogo guardado {version}: {str(e)}")
+            return None
+
+    def latest(self):
+        """El catálogo guardado más reciente que se pueda abrir, o None."""
+        for path in self._saved():
+            catalog = self.open(path.name[len('catalog-'):])
+            if catalog is not None:
+                return catalog
+        return None
+
+    def newest(self):
+        """
+        Versión y versión de origen (la del CSV) del catálogo guardado más reciente, sin
+        abrirlo; None si no hay ninguno.
+        """
+        for path in self._saved():
+            manifest = _read_manifest(path)
+            if manifest is not None and manifest.get('format') == STORE_FORMAT:
+                return manifest['version'], manifest.get('source', manifest['version'])
+        return None
+
+    def save(self, catalog):
+        """Guarda `catalog` (si su versión no estaba ya) y elimina las versiones antiguas."""
+        target = self.path(catalog.version)
+        stored = (_read_manifest(target) or {}).get('format')
+        if stored == STORE_FORMAT:
+            return
+        if stored is not None:
+            # Guardado con otro formato: se reemplaza (quien lo tenga abierto lo sigue leyendo)
+            shutil.rmtree(target, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f'.{target.name}-', dir=self.directory))
+        try:
+            save_catalog(catalog, tmp)
+            os.rename(tmp, target)
+        except OSError:
+            # Otro proceso publicó la misma versión mientras se escribía esta
+            if not (target / MANIFEST_NAME).is_file():
+                raise
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+        self._prune(target)
+
+    def _saved(self):
+        """Carpetas de versiones publicadas, de la más reciente a la más antigua."""
+        if not self.directory.is_dir():
+            return []
+        return sorted((p for p in self.directory.glob('catalog-*') if (p / MANIFEST_NAME).is_file()),
+                      key=lambda p: p.stat().st_mtime, reverse=True)
+
+    def _prune(self, current):
+        """
+        Elimina las versiones antiguas, conservando las `keep` más recientes. Los procesos
+        que aún las tienen abiertas siguen leyéndolas: el sistema libera los archivos
+        cuando se cierra el último mmap.
+        """
+        for old in self._saved()[self.keep:]:
+            if old != current:
+                shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,444 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Separador entre filas dentro del buffer de texto; ningún trigrama lo cruza
+SEPARATOR = '\x00'
+
+# Caracteres con significado especial en una expresión regular
+REGEX_META = set('.^$*+?{}[]\\|()')
+
+# Filas que se pasan a la vez a strings de Python al recorrer con regex un texto de Arrow
+REGEX_CHUNK_ROWS = 65536
+
+# Separadores que se ignoran al comparar códigos de proveedor
+_CODE_SEPARATORS = re.compile(r'[\s\-./_]+')
+
+
+def is_literal(term):
+    """
+    Indica si un término se puede buscar como subcadena literal
+    (es decir, no contiene metacaracteres de expresión regular).
+    """
+    return not any(c in REGEX_META for c in term)
+
+
+def normalize_texts(values):
+    """
+    Convierte una columna de texto en una lista de strings en minúsculas, sin nulos.
+    """
+    return [v.lower().replace(SEPARATOR, ' ') if isinstance(v, str) else '' for v in values]
+
+
+def normalize_code(value):
+    """
+    Normaliza un código de proveedor para compararlo: sin espacios, guiones, puntos,
+    barras ni guiones bajos, y en mayúsculas. Los códigos leídos como número pierden el '.0'.
+    """
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ''
+        if value.is_integer():
+            value = int(value)
+    if value is None:
+        return ''
+    return _CODE_SEPARATORS.sub('', str(value)).upper()
+
+
+def _codepoints(text):
+    """Devuelve los códigos Unicode de `text` como arreglo int64."""
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+
+def _trigram_keys(codes):
+    """
+    Codifica cada trigrama de `codes` en un entero de 63 bits (21 bits por carácter).
+
+    Returns:
+        tuple: (claves, válidos) donde válidos marca los trigramas que no contienen el separador
+    """
+    a, b, c = codes[:-2], codes[1:-1], codes[2:]
+    keys = (a << 42) | (b << 21) | c
+    valid = (a != 0) & (b != 0) & (c != 0)
+    return keys, valid
+
+
+class TrigramIndex:
+    """
+    Índice invertido de trigramas de caracteres sobre una columna de texto.
+
+    Cada trigrama del texto en minúsculas apunta a la lista ordenada de filas que lo
+    contienen. Un término se resuelve intersectando las listas de sus trigramas y
+    verificando con una búsqueda real de subcadena sólo las filas candidatas.
+    """
+
+    def __init__(self, values):
+        """
+        Args:
+            values (iterable): Valores de la columna, en el orden de las filas del catálogo
+        """
+        self.texts = np.array(normalize_texts(values), dtype=object)
+        self.n_rows = len(self.texts)
+
+        # Un único buffer en minúsculas (como códigos Unicode) con todas las filas separadas
+        # por SEPARATOR, y la posición donde empieza cada fila; sobre él se buscan varios
+        # términos a la vez
+        lengths = np.fromiter((len(t) for t in self.texts), dtype=np.int64, count=self.n_rows)
+        self.codes = _codepoints(SEPARATOR.join(self.texts) + SEPARATOR).astype(np.uint32) if self.n_rows else np.empty(0, dtype=np.uint32)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]).astype(np.int64) if self.n_rows else np.empty(0, dtype=np.int64)
+        self._keys, self._starts, self._rows = self._build(self.codes.astype(np.int64), lengths)
+
+    @staticmethod
+    def _build(codes, lengths):
+        n = len(lengths)
+        empty = (np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32))
+        if n == 0:
+            return empty
+
+        if len(codes) < 3:
+            return empty
+        row_of_pos = np.repeat(np.arange(n, dtype=np.int32), lengths + 1)
+
+        keys, valid = _trigram_keys(codes)
+        keys = keys[valid]
+        rows = row_of_pos[:-2][valid]
+
+        # Ordenar por (trigrama, fila) y eliminar pares repetidos
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        new = np.ones(len(keys), dtype=bool)
+        new[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, rows = keys[new], rows[new]
+
+        unique_keys, starts = np.unique(keys, return_index=True)
+        starts = np.append(starts, len(keys)).astype(np.int64)
+        return unique_keys, starts, rows
+
+    def _postings(self, key):
+        i = np.searchsorted(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return self._rows[:0]
+        return self._rows[self._starts[i]:self._starts[i + 1]]
+
+    def _term_postings(self, term):
+        """
+        Listas de filas de los trigramas de `term`, de la más corta a la más larga.
+
+        Returns:
+            list | None: None si el término es demasiado corto para resolverse con el índice
+        """
+        if len(term) < 3 or SEPARATOR in term:
+            return None
+        keys, _ = _trigram_keys(_codepoints(term))
+        return sorted((self._postings(k) for k in np.unique(keys)), key=len)
+
+    def estimate(self, term):
+        """
+        Cota superior barata del número de filas que contienen `term`.
+
+        Los términos que no se pueden resolver con el índice devuelven el total de filas.
+        """
+        if not is_literal(term):
+            return self.n_rows
+        postings = self._term_postings(term)
+        if postings is None:
+            return self.n_rows
+        return len(postings[0])
+
+    def is_indexable(self, term):
+        """Indica si `term` se resuelve con el índice en lugar de recorrer la columna."""
+        return is_literal(term) and len(term) >= 3 and SEPARATOR not in term
+
+    def candidates(self, term, rows=None):
+        """
+        Filas que contienen todos los trigramas de `term`.
+
+        Args:
+            term (str): Término en minúsculas
+            rows (numpy.ndarray): Si se indica, sólo se consideran estas posiciones (ordenadas)
+
+        Returns:
+            numpy.ndarray | None: Posiciones ordenadas, o None si el término es demasiado
+            corto para resolverse con el índice
+        """
+        postings = self._term_postings(term)
+        if postings is None:
+            return None
+        result = postings[0] if rows is None else intersect_sorted(rows, postings[0])
+        for other in postings[1:]:
+            if len(result) == 0:
+                break
+            result = intersect_sorted(result, other)
+        return result
+
+    def _scan(self, term, rows, regex):
+        """
+        Recorre el texto (completo o sólo `rows`) buscando `term`.
+
+        `texts` puede ser un arreglo de Arrow abierto con mmap (ver store.py): el texto
+        literal se busca directamente sobre él, y las regex se evalúan con `re` (igual que
+        sobre el catálogo armado en memoria) de a REGEX_CHUNK_ROWS filas, sin copiar la
+        columna entera a strings de Python.
+        """
+        texts = self.texts if rows is None else self.texts.take(rows)
+        if isinstance(texts, np.ndarray):
+            hits = pd.Series(texts, dtype=object).str.contains(term, regex=regex).to_numpy(dtype=bool)
+        elif not regex:
+            hits = pd.Series(texts).str.contains(term, regex=False).to_numpy(dtype=bool)
+        else:
+            hits = np.concatenate([
+                pd.Series(np.asarray(texts[i:i + REGEX_CHUNK_ROWS], dtype=object), dtype=object)
+                .str.contains(term, regex=True).to_numpy(dtype=bool)
+                for i in range(0, len(texts), REGEX_CHUNK_ROWS)
+            ] or [np.empty(0, dtype=bool)])
+        return np.flatnonzero(hits) if rows is None else rows[hits]
+
+    def _verify(self, term, rows):
+        """Confirma con una búsqueda real de subcadena cuáles de `rows` contienen `term`."""
+        texts = self.texts.take(rows)
+        hits = np.fromiter((term in t for t in texts), dtype=bool, count=len(rows))
+        return rows[hits]
+
+    def find(self, term, rows=None):
+        """
+        Posiciones ordenadas de las filas cuyo texto contiene `term` (ya en minúsculas).
+
+        Los términos con metacaracteres de expresión regular se evalúan como regex, igual
+        que `str.contains`; los términos cortos se buscan recorriendo el texto.
+
+        Args:
+            term (str): Término en minúsculas
+            rows (numpy.ndarray): Si se indica, sólo se evalúan estas posiciones (ordenadas)
+        """
+        if rows is not None and len(rows) == 0:
+            return rows
+        if not is_literal(term):
+            return self._scan(term, rows, regex=True)
+        postings = self._term_postings(term)
+        if postings is None:
+            return self._scan(term, rows, regex=False)
+        if rows is not None and len(rows) <= len(postings[0]):
+            # Quedan menos filas que en la lista más corta: conviene verificarlas directamente
+            return self._verify(term, rows)
+        return self._verify(term, self.candidates(term, rows))
+
+    def find_many(self, terms, rows=None):
+        """
+        Filas que contienen cada uno de `terms`, recorriendo el buffer una sola vez.
+
+        Pensado para los términos que el índice no puede acotar (p. ej. de uno o dos
+        caracteres): en lugar de recorrer el texto una vez por término, un
+        MultiPatternMatcher los busca todos juntos sobre el buffer de códigos. Con `rows`
+        sólo se recorre el tramo del buffer que va de la primera a la última de ellas.
+
+        Args:
+            terms (iterable): Términos literales en minúsculas
+            rows (numpy.ndarray): Si se indica, el resultado se restringe a estas posiciones (ordenadas)
+
+        Returns:
+            dict: Término -> posiciones ordenadas de las filas que lo contienen
+        """
+        matcher = MultiPatternMatcher(terms)
+        if rows is None:
+            return matcher.find_rows(self.codes, self.offsets)
+        if len(rows) == 0:
+            return {term: rows for term in matcher.terms}
+        first, last = int(rows[0]), int(rows[-1])
+        start = self.offsets[first]
+        end = self.offsets[last + 1] if last + 1 < self.n_rows else len(self.codes)
+        found = matcher.find_rows(self.codes[start:end], self.offsets[first:last + 1] - start)
+        return {term: intersect_sorted(rows, hits + first) for term, hits in found.items()}
+
+
+class ShardedTextIndex:
+    """
+    Índice de una columna repartido en fragmentos contiguos de filas (uno por proveedor).
+
+    Cada fragmento tiene su propio TrigramIndex con posiciones locales; éste traduce las
+    posiciones globales del catálogo a las de cada fragmento y sólo consulta los
+    fragmentos que tienen filas candidatas, de modo que una búsqueda restringida a
+    algunos proveedores no recorre el texto de los demás.
+    """
+
+    def __init__(self, indexes, offsets):
+        """
+        Args:
+            indexes (list): TrigramIndex de cada fragmento, en el orden de las filas
+            offsets (numpy.ndarray): Posición global de la primera fila de cada fragmento
+        """
+        self.indexes = list(indexes)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_rows = int(self.offsets[-1] + self.indexes[-1].n_rows) if self.indexes else 0
+        self._bounds = np.append(self.offsets, self.n_rows)
+
+    def _parts(self, rows):
+        """(índice, filas locales o None, desplazamiento) de cada fragmento con filas en `rows`."""
+        if rows is None:
+            for index, offset in zip(self.indexes, self.offsets):
+                yield index, None, offset
+            return
+        cuts = np.searchsorted(rows, self._bounds)
+        for i, index in enumerate(self.indexes):
+            if cuts[i] < cuts[i + 1]:
+                yield index, rows[cuts[i]:cuts[i + 1]] - self.offsets[i], self.offsets[i]
+
+    @staticmethod
+    def _join(parts):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def estimate(self, term):
+        return sum(index.estimate(term) for index in self.indexes)
+
+    def is_indexable(self, term):
+        return is_literal(term) and len(term) >= 3 and SEPARATOR not in term
+
+    def find(self, term, rows=None):
+        """Posiciones globales ordenadas de las filas (de `rows`, si se indica) que contienen `term`."""
+        if rows is not None and len(rows) == 0:
+            return rows
+        return self._join([index.find(term, local) + offset for index, local, offset in self._parts(rows)])
+
+    def find_many(self, terms, rows=None):
+        """Como TrigramIndex.find_many, fragmento por fragmento."""
+        terms = list(terms)
+        found = {term: [] for term in terms}
+        for index, local, offset in self._parts(rows):
+            for term, hits in index.find_many(terms, local).items():
+                found[term].append(hits + offset)
+        return {term: self._join(parts) for term, parts in found.items()}
+
+
+class MultiPatternMatcher:
+    """
+    Búsqueda de varios términos literales a la vez sobre el buffer de códigos Unicode.
+
+    El buffer se recorre una sola vez para hallar las posiciones donde empieza alguno de
+    los términos (su primer carácter); cada término se resuelve verificando sus demás
+    caracteres sólo en esas posiciones candidatas, sin armar claves sobre todo el buffer.
+    """
+
+    def __init__(self, terms):
+        """
+        Args:
+            terms (iterable): Términos literales (no vacíos) a buscar
+        """
+        self.terms = sorted({t for t in terms if t})
+        self._codes = {t: _codepoints(t) for t in self.terms}
+
+    def find_rows(self, codes, offsets):
+        """
+        Filas que contienen cada término.
+
+        Args:
+            codes (numpy.ndarray): Códigos Unicode de todas las filas, separadas por 0
+            offsets (numpy.ndarray): Posición donde empieza cada fila dentro de `codes`
+
+        Returns:
+            dict: Término -> posiciones ordenadas de las filas que lo contienen
+        """
+        found = {t: np.empty(0, dtype=np.int64) for t in self.terms}
+        if not self.terms:
+            return found
+        # Única pasada por el buffer: posiciones con el primer carácter de algún término
+        # (tabla indexada por código; los mayores que todos caen en la última entrada, vacía)
+        firsts = np.unique([self._codes[t][0] for t in self.terms])
+        is_first = np.zeros(int(firsts[-1]) + 2, dtype=bool)
+        is_first[firsts] = True
+        candidates = np.flatnonzero(is_first[np.minimum(codes, len(is_first) - 1)])
+        leading = codes[candidates]
+
+        for term in self.terms:
+            term_codes = self._codes[term]
+            starts = candidates[leading == term_codes[0]]
+            # Verificar el resto de los caracteres en las posiciones candidatas
+            for k, code in enumerate(term_codes[1:], start=1):
+                starts = starts[starts + k < len(codes)]
+                starts = starts[codes[starts + k] == code]
+            # Las posiciones vienen ordenadas, así que sus filas también: basta quitar repetidas
+            rows = np.searchsorted(offsets, starts, side='right') - 1
+            if len(rows):
+                rows = rows[np.concatenate(([True], rows[1:] != rows[:-1]))]
+            found[term] = rows
+        return found
+
+
+class SkuIndex:
+    """
+    Índice de códigos de proveedor ("Codigo Prov").
+
+    Los códigos normalizados se guardan ordenados; tanto la búsqueda exacta como la por
+    prefijo son búsquedas binarias sobre ese arreglo, que se puede abrir desde disco con
+    mmap sin reconstruir nada (ver store.py).
+    """
+
+    def __init__(self, values, normalized=False):
+        """
+        Args:
+            values (iterable): Códigos de la columna, en el orden de las filas del catálogo
+            normalized (bool): Los códigos ya vienen normalizados (p. ej. de los fragmentos)
+        """
+        if normalized:
+            self.codes = np.asarray(values, dtype=object)
+        else:
+            self.codes = np.array([normalize_code(v) for v in values], dtype=object)
+        order = np.argsort(self.codes, kind='stable')
+        self._sorted_codes = self.codes[order]
+        self._sorted_rows = order.astype(np.int64)
+
+    def exact(self, code):
+        """Posiciones ordenadas de las filas cuyo código normalizado es igual a `code`."""
+        code = normalize_code(code)
+        if not code:
+            return self._sorted_rows[:0]
+        lo = np.searchsorted(self._sorted_codes, code, side='left')
+        hi = np.searchsorted(self._sorted_codes, code, side='right')
+        return np.sort(self._sorted_rows[lo:hi])
+
+    def prefix(self, code, limit=None):
+        """Posiciones ordenadas de las filas cuyo código normalizado empieza con `code`."""
+        code = normalize_code(code)
+        if not code:
+            return self._sorted_rows[:0]
+        lo = np.searchsorted(self._sorted_codes, code, side='left')
+        hi = np.searchsorted(self._sorted_codes, code + '\U0010ffff', side='left')
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return np.sort(self._sorted_rows[lo:hi])
+
+    def lookup(self, code, limit=500):
+        """Coincidencias exactas de `code`; si no hay, las que empiezan con `code`."""
+        rows = self.exact(code)
+        if len(rows) == 0:
+            rows = self.prefix(code, limit)
+        return rows
+
+
+def intersect_sorted(a, b):
+    """Intersección de dos arreglos ordenados sin repetidos, buscando el menor dentro del mayor."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    idx = np.searchsorted(b, a)
+    idx[idx == len(b)] = len(b) - 1
+    return a[b[idx] == a]
+
+
+def difference_sorted(a, b):
+    """Elementos de `a` que no están en `b` (ambos ordenados sin repetidos)."""
+    if len(a) == 0 or len(b) == 0:
+        return a
+    idx = np.searchsorted(b, a)
+    idx[idx == len(b)] = len(b) - 1
+    return a[b[idx] != a]
+
+
+def build_text_indexes(df, columns=('search_text', 'Descripcion')):
+    """
+    Construye un TrigramIndex por cada columna de texto buscable del catálogo.
+
+    Returns:
+        dict: Nombre de columna -> TrigramIndex
+    """
+    return {col: TrigramIndex(df[col].tolist()) for col in columns if col in df.columns}
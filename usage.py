@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+# Columna con el conteo de búsquedas en los agregados
+COUNT = 'búsquedas'
+
+# Multiplicador para combinar (hora, usuario) en una sola clave entera ordenable
+_USER_SLOTS = 1 << 20
+
+
+def _hour_key(timestamps):
+    """Horas transcurridas desde 1970-01-01 (hora local, sin zona) como int64."""
+    return np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+
+
+def _to_timestamps(keys, unit):
+    """Convierte claves enteras de periodo en fechas (sólo para las pocas claves agrupadas)."""
+    return pd.DatetimeIndex(np.asarray(keys, dtype=np.int64).astype(f'datetime64[{unit}]'))
+
+
+def day_from_hour(hour_key):
+    return hour_key // 24
+
+
+def month_from_day(day_key):
+    return np.asarray(day_key, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+class UsageCube:
+    """
+    Conteo materializado de búsquedas por usuario y hora.
+
+    Se guarda como arreglos ordenados por la clave (hora, usuario), de modo que un periodo
+    se corta con `searchsorted` y los reportes por día o mes se agrupan con claves
+    enteras. Se actualiza de forma incremental con cada lote de logs nuevos.
+
+    Las claves y sus conteos se guardan juntos en `_state`, y los usuarios en `_users`
+    (nombres por código, código por nombre); cada actualización arma tuplas nuevas y las
+    reemplaza con una sola asignación, así que un lector que las toma una vez nunca mezcla
+    el agregado anterior con el nuevo.
+    """
+
+    def __init__(self):
+        self._state = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self._users = ((), {})
+
+    @classmethod
+    def from_events(cls, events):
+        """Crea el agregado a partir de un DataFrame de logs (timestamp, username)."""
+        cube = cls()
+        cube.update(events)
+        return cube
+
+    def update(self, events):
+        """Suma al agregado los conteos de un lote de logs nuevos."""
+        if events is None or events.empty or 'timestamp' not in events.columns:
+            return
+        events = events.dropna(subset=['timestamp'])
+        hours = _hour_key(events['timestamp'].to_numpy())
+        # Los usuarios nuevos se agregan sobre copias; los lectores siguen con las anteriores
+        old_names, old_codes = self._users
+        names, codes = list(old_names), dict(old_codes)
+        for username in events['username'].astype(str).unique():
+            if username not in codes:
+                codes[username] = len(names)
+                names.append(username)
+        users = events['username'].astype(str).map(codes).to_numpy(dtype=np.int64)
+        old_keys, old_counts = self._state
+        keys = np.concatenate([old_keys, hours * _USER_SLOTS + users])
+        counts = np.concatenate([old_counts, np.ones(len(hours), dtype=np.int64)])
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        # Los usuarios se publican antes que las claves que los usan
+        self._users = (tuple(names), codes)
+        self._state = (unique_keys, np.bincount(inverse, weights=counts).astype(np.int64))
+
+    def __len__(self):
+        return len(self._state[0])
+
+    @property
+    def users(self):
+        """Usuarios con al menos una búsqueda."""
+        return sorted(self._users[0])
+
+    def _slice(self, start, end, username=None, exclude_users=()):
+        """Claves (hora, código de usuario) y conteos en [start, end)."""
+        keys, counts = self._state
+        user_codes = self._users[1]
+        lo_hour, hi_hour = _hour_key([np.datetime64(pd.Timestamp(start)), np.datetime64(pd.Timestamp(end))])
+        # Si `end` no cae justo en una hora, la hora en curso también cuenta
+        if pd.Timestamp(end) > pd.Timestamp(hi_hour.astype('datetime64[h]')):
+            hi_hour += 1
+        i, j = np.searchsorted(keys, [lo_hour * _USER_SLOTS, hi_hour * _USER_SLOTS], side='left')
+        hours, users, counts = keys[i:j] // _USER_SLOTS, keys[i:j] % _USER_SLOTS, counts[i:j]
+        if username is not None:
+            mask = users == user_codes.get(username, -1)
+            hours, users, counts = hours[mask], users[mask], counts[mask]
+        if exclude_users:
+            excluded = [user_codes[u] for u in exclude_users if u in user_codes]
+            mask = ~np.isin(users, excluded)
+            hours, users, counts = hours[mask], users[mask], counts[mask]
+        return hours, users, counts
+
+    def total(self, start, end, username=None, exclude_users=()):
+        """Total de búsquedas en [start, end)."""
+        return int(self._slice(start, end, username, exclude_users)[2].sum())
+
+    def rollup(self, start, end, by, username=None, exclude_users=()):
+        """
+        Conteos en [start, end) agrupados por `by`.
+
+        Args:
+            start, end: Límites del periodo (end excluido)
+            by (str): 'username', 'hour' (hora del día), 'day' o 'month'
+            username (str): Si se indica, sólo ese usuario
+            exclude_users (iterable): Usuarios que no se cuentan (p. ej. administradores)
+
+        Returns:
+            pandas.DataFrame: Columnas `by` y 'búsquedas'
+        """
+        hours, users, counts = self._slice(start, end, username, exclude_users)
+        if by == 'username':
+            codes = users
+        elif by == 'hour':
+            codes = hours % 24
+        elif by == 'day':
+            codes = day_from_hour(hours)
+        elif by == 'month':
+            codes = month_from_day(day_from_hour(hours))
+        else:
+            raise ValueError(f"Agrupación no soportada: {by}")
+
+        keys, inverse = np.unique(codes, return_inverse=True)
+        totals = np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+
+        # Sólo las claves agrupadas se convierten en etiquetas
+        if by == 'username':
+            labels = [self._users[0][k] for k in keys]
+        elif by == 'hour':
+            labels = keys
+        elif by == 'day':
+            labels = _to_timestamps(keys, 'D')
+        else:
+            labels = _to_timestamps(keys, 'M')
+        return pd.DataFrame({by: labels, COUNT: totals})